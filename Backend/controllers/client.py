@@ -1,12 +1,34 @@
-from fastapi import APIRouter, HTTPException, Query, Depends, Request
-#from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, HTTPException, Query, Depends, Request, Header
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, EmailStr, field_validator
 from typing import Optional, List
+import os
+import json
 import logging
+import secrets
 from models.client_model import ClientModel
 from services.client_service import ClientService
+from http_client import init_http_clients, close_http_clients
+from services.email_queue import start_email_workers, stop_email_workers, email_queue_stats
 from datetime import datetime
-from rag_engine import search_all_sources, search_all_sources_debug
+from rag_engine import (
+    search_all_sources,
+    search_all_sources_async,
+    search_all_sources_debug,
+    retrieve_async,
+    sources_for_site,
+    start_background_init,
+    start_data_watcher,
+    reload_stores,
+    readiness,
+    index_generation,
+    embed_query_async,
+    get_async_openai_client
+)
+from db.config import get_database_by_website_source
+from rag.cache import AnswerCache, normalize_query
+from rag.prompt import build_grounded_messages
+from rag.singleflight import SingleFlight
 
 # Import from client_service properly
 try:
@@ -23,6 +45,21 @@ except ImportError as e:
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+@router.on_event("startup")
+async def start_rag_stores():
+    """Load the RAG stores in the background so startup is not blocked by embedding calls"""
+    await init_http_clients()
+    await start_email_workers()
+    start_background_init()
+    start_data_watcher()
+
+
+@router.on_event("shutdown")
+async def close_upstream_connections():
+    """Drain the email queue, then close the pooled OpenAI/SendGrid keep-alive connections"""
+    await stop_email_workers()
+    await close_http_clients()
+
 # Pydantic models with validation
 class ClientRequest(BaseModel):
     clientfname: Optional[str] = None
@@ -66,6 +103,7 @@ class ClientResponse(BaseModel):
     message: str
     database: Optional[str] = None
     email_sent: Optional[bool] = None
+    email_queued: Optional[bool] = None
     is_new_client: Optional[bool] = None
     timestamp: Optional[str] = None
 
@@ -145,37 +183,235 @@ async def get_clients(
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
+@router.get("/health")
+async def health():
+    """Readiness of the chat knowledge base (503 until the RAG stores are loaded)"""
+    rag_status = readiness()
+    return JSONResponse(
+        status_code=200 if rag_status["ready"] else 503,
+        content={
+            "status": "healthy" if rag_status["ready"] else "starting",
+            "timestamp": datetime.now().isoformat(),
+            "rag": rag_status,
+            "email_queue": email_queue_stats()
+        }
+    )
+
+
+# Shared secret for /admin endpoints; unset disables them
+ADMIN_TOKEN = os.getenv("rag_admin_token")
+
+
+@router.post("/admin/reload", status_code=202)
+async def admin_reload(x_admin_token: Optional[str] = Header(None)):
+    """Rebuild the knowledge base from the data files and hot-swap it (no restart)
+
+    Returns immediately; queries keep using the current index until the
+    new one is ready. Progress is reported under "rag" in /health.
+    """
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints disabled: rag_admin_token not set")
+    if not secrets.compare_digest((x_admin_token or "").encode("utf-8"), ADMIN_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+    started = reload_stores(trigger="admin")
+    rag_status = readiness()
+    return {
+        "status": "reloading" if started else ("queued" if rag_status["ready"] else "starting"),
+        "generation": rag_status["generation"],
+        "timestamp": datetime.now().isoformat()
+    }
+
+
+# GPT fallback settings for /chat
+CHAT_MODEL = "gpt-3.5-turbo"
+CHAT_SYSTEM_PROMPT = "You are a helpful assistant for Nordisk Support Solutions."
+CHAT_MAX_TOKENS = 300
+CHAT_TEMPERATURE = 0.7
+
+# "direct": return the best stored line verbatim, else ask GPT without context.
+# "grounded": always ask GPT, with the top retrieved passages packed into the prompt.
+CHAT_MODE = os.getenv("chat_mode", "direct").lower()
+CHAT_CONTEXT_TOP_K = int(os.getenv("chat_context_top_k", "5"))
+CHAT_CONTEXT_MIN_SCORE = float(os.getenv("chat_context_min_score", "0.3"))
+CHAT_CONTEXT_TOKEN_BUDGET = int(os.getenv("chat_context_token_budget", "800"))
+# Grounded answers restate our data, so they need far fewer tokens
+CHAT_GROUNDED_MAX_TOKENS = int(os.getenv("chat_grounded_max_tokens", "150"))
+
+# Cache of GPT fallback answers; chat_answer_cache_semantic (e.g. 0.95) also reuses
+# the answer of a cached question whose embedding is at least that similar.
+# chat_answer_cache_size=0 turns the cache off; chat_answer_cache_ttl=0 means no expiry
+def _new_answer_cache():
+    return AnswerCache(
+        max_entries=int(os.getenv("chat_answer_cache_size", "512")),
+        ttl=float(os.getenv("chat_answer_cache_ttl", "3600")),
+        semantic_threshold=float(os.getenv("chat_answer_cache_semantic", "0"))
+    )
+
+
+answer_cache = _new_answer_cache()
+# Grounded answers depend on the routed sources, so each routed site gets its own
+# cache: neither exact nor semantic lookups can return another site's answer
+site_answer_caches = {}
+
+
+def _answer_cache_for(site: Optional[str]) -> AnswerCache:
+    if site is None:
+        return answer_cache
+    if site not in site_answer_caches:
+        site_answer_caches[site] = _new_answer_cache()
+    return site_answer_caches[site]
+
+# Concurrent identical fallback questions share one completion call
+completion_flight = SingleFlight()
+
+
+def _chat_params():
+    """Everything besides the question that shapes a fallback answer (the cache scope)"""
+    return {
+        "model": CHAT_MODEL,
+        "system_prompt": CHAT_SYSTEM_PROMPT,
+        "max_tokens": CHAT_MAX_TOKENS,
+        "temperature": CHAT_TEMPERATURE,
+        "mode": CHAT_MODE,
+        "grounded_max_tokens": CHAT_GROUNDED_MAX_TOKENS,
+        # Grounded answers restate the knowledge base: a reload invalidates them
+        "knowledge_generation": index_generation() if CHAT_MODE == "grounded" else None
+    }
+
+
+def _completion_request(user_message: str, hits: List[dict]):
+    """Messages and max_tokens for the LLM call, grounded in hits when there are any"""
+    if hits:
+        messages, _ = build_grounded_messages(
+            user_message, hits, CHAT_SYSTEM_PROMPT, CHAT_CONTEXT_TOKEN_BUDGET
+        )
+        return messages, CHAT_GROUNDED_MAX_TOKENS
+
+    messages = [
+        {"role": "system", "content": CHAT_SYSTEM_PROMPT},
+        {"role": "user", "content": user_message}
+        ]
+    return messages, CHAT_MAX_TOKENS
+
+
+def _sse(data, event: Optional[str] = None) -> str:
+    """Format one server-sent event; data is JSON-encoded so newlines survive"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+async def _complete_and_cache(cache: AnswerCache, user_message: str, params: dict, messages: List[dict], max_tokens: int, query_vector=None):
+    response = await get_async_openai_client().chat.completions.create(
+        model=CHAT_MODEL,
+        messages=messages,
+        max_tokens=max_tokens,
+        temperature=CHAT_TEMPERATURE
+    )
+    reply = str(response.choices[0].message.content).strip().strip('"')
+    cache.put(user_message, params, reply, query_vector)
+    return reply
+
+
+async def _stream_gpt_reply(cache: AnswerCache, user_message: str, params: dict, messages: List[dict], max_tokens: int, query_vector=None):
+    """Forward completion tokens as SSE `data` events as soon as they arrive"""
+    parts = []
+    try:
+        stream = await get_async_openai_client().chat.completions.create(
+            model=CHAT_MODEL,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=CHAT_TEMPERATURE,
+            stream=True
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+                yield _sse(chunk.choices[0].delta.content)
+        cache.put(user_message, params, "".join(parts).strip().strip('"'), query_vector)
+        yield _sse({"source": "gpt"}, event="done")
+    except Exception as e:
+        logger.error(f"Error streaming chat completion: {e}")
+        yield _sse(str(e), event="error")
+
+
 @router.post("/chat")
 async def chat(request:Request):
-    """Chat endpoint using OpenAI client"""
+    """Chat endpoint using the async OpenAI client (never blocks the event loop)
+
+    Send {"stream": true} (or ?stream=true) to receive the GPT fallback as
+    text/event-stream: one `data` event per token, then an `event: done`.
+    RAG matches are sent straight away as a single event.
+
+    With chat_mode=grounded every answer comes from GPT, prompted with the
+    top retrieved passages instead of returning a stored line verbatim.
+
+    An optional "website_source" routes the search to that site's sources
+    (falling back to all sources when nothing relevant is found there).
+    """
     
-    from app import client  # Import the OpenAI client from app.py
     try:
         data=await request.json()
         user_message = data.get("message","")
         if not user_message:
             raise HTTPException(status_code=400, detail="Message is required")
+        stream = bool(data.get("stream")) or request.query_params.get("stream") == "true"
+        website_source = data.get("website_source")
+        sources = sources_for_site(website_source)
+        # Taken before the search, so the answer is cached under the knowledge base it was grounded on
+        params = _chat_params()
 
         # ---- RAG Search ----
-        # Use search_all_sources instead of get_best_match
-        match = search_all_sources(user_message, threshold=0.65)
+        hits = []
+        match = None
+        if CHAT_MODE == "grounded":
+            hits = await retrieve_async(
+                user_message, top_k=CHAT_CONTEXT_TOP_K, threshold=CHAT_CONTEXT_MIN_SCORE, sources=sources
+            )
+        else:
+            # Use search_all_sources instead of get_best_match
+            match = await search_all_sources_async(user_message, threshold=0.65, sources=sources)
         #debug_result = search_all_sources_debug(user_message, threshold=0.65)
         # print("mmmmmmmmmmmmmmmmmmm:",debug_result)
         if match:
-            
-            return str(match["text"]).strip().replace("\n"," ").strip('"')
-
-        # Fallback to GPT
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant for Nordisk Support Solutions."},
-                {"role": "user", "content": user_message}
-                ],
-            max_tokens=300,
-            temperature=0.7
+            text = str(match["text"]).strip().replace("\n"," ").strip('"')
+            if stream:
+                events = [_sse(text), _sse({"source": match["source"]}, event="done")]
+                return StreamingResponse(iter(events), media_type="text/event-stream")
+            return text
+
+        # Fallback to GPT, unless this (or, in semantic mode, a similar) question was answered recently
+        site = None
+        if CHAT_MODE == "grounded" and sources is not None:
+            site = get_database_by_website_source(website_source)
+        cache = _answer_cache_for(site)
+        query_vector = None
+        if cache.semantic_threshold:
+            query_vector = await embed_query_async(user_message)
+
+        cached = cache.get(user_message, params, query_vector)
+        if cached is not None:
+            if stream:
+                events = [_sse(cached), _sse({"source": "cache"}, event="done")]
+                return StreamingResponse(iter(events), media_type="text/event-stream")
+            return cached
+
+        if get_async_openai_client() is None:
+            raise HTTPException(status_code=503, detail="Chat fallback unavailable: openai_api_key not set")
+
+        messages, max_tokens = _completion_request(user_message, hits)
+        if stream:
+            return StreamingResponse(
+                _stream_gpt_reply(cache, user_message, params, messages, max_tokens, query_vector),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+            )
+
+        # A question asked many times at once (e.g. during an outage) costs one completion
+        reply = await completion_flight.do(
+            (site, normalize_query(user_message)),
+            lambda: _complete_and_cache(cache, user_message, params, messages, max_tokens, query_vector)
         )
-        reply = str(response.choices[0].message.content).strip().strip('"')
                 
         return reply
         # {
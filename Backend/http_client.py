@@ -0,0 +1,98 @@
+# http_client.py
+import os
+import logging
+import threading
+import httpx
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+# One pooled client per upstream, so each host gets its own connection limits.
+# Limits come from http_<upstream>_max_connections etc., falling back to http_max_connections
+UPSTREAMS = ("openai", "sendgrid")
+
+# Pooled keep-alive clients, reused for every request to an upstream
+_async_clients: Dict[str, httpx.AsyncClient] = {}
+_sync_clients: Dict[str, httpx.Client] = {}
+_lock = threading.Lock()
+
+
+def _setting(upstream: str, name: str, default: str) -> str:
+    return os.getenv(f"http_{upstream}_{name}") or os.getenv(f"http_{name}", default)
+
+
+def _http2_enabled(upstream: str) -> bool:
+    """HTTP/2 when requested (default) and the optional h2 package is installed"""
+    if _setting(upstream, "http2", "true").lower() != "true":
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _client_options(upstream: str) -> dict:
+    return {
+        "limits": httpx.Limits(
+            max_connections=int(_setting(upstream, "max_connections", "100")),
+            max_keepalive_connections=int(_setting(upstream, "max_keepalive", "20")),
+            keepalive_expiry=float(_setting(upstream, "keepalive_expiry", "60"))
+        ),
+        "timeout": httpx.Timeout(
+            float(_setting(upstream, "timeout", "60")),
+            connect=float(_setting(upstream, "connect_timeout", "5"))
+        ),
+        "http2": _http2_enabled(upstream)
+    }
+
+
+def get_async_http_client(upstream: str) -> httpx.AsyncClient:
+    """Shared AsyncClient for an upstream, created on first use"""
+    with _lock:
+        client = _async_clients.get(upstream)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(**_client_options(upstream))
+            _async_clients[upstream] = client
+        return client
+
+
+def get_http_client(upstream: str) -> httpx.Client:
+    """Shared blocking Client for an upstream (thread-safe), created on first use"""
+    with _lock:
+        client = _sync_clients.get(upstream)
+        if client is None or client.is_closed:
+            client = httpx.Client(**_client_options(upstream))
+            _sync_clients[upstream] = client
+        return client
+
+
+async def init_http_clients():
+    """Create the pooled clients of every upstream (startup)"""
+    for upstream in UPSTREAMS:
+        get_async_http_client(upstream)
+        logger.info(
+            f"HTTP client ready for {upstream} "
+            f"(http2={'on' if _client_options(upstream)['http2'] else 'off'})"
+        )
+
+
+async def close_http_clients():
+    """Close every pooled client and its keep-alive connections (shutdown)"""
+    with _lock:
+        async_clients = list(_async_clients.values())
+        sync_clients = list(_sync_clients.values())
+        _async_clients.clear()
+        _sync_clients.clear()
+
+    for client in async_clients:
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.error(f"Error closing HTTP client: {e}")
+    for client in sync_clients:
+        try:
+            client.close()
+        except Exception as e:
+            logger.error(f"Error closing HTTP client: {e}")
+    logger.info("HTTP clients closed")
@@ -0,0 +1,69 @@
+# rag/__init__.py
+from .batch import embed_in_batches, EmbeddingBatcher
+from .cache import EmbeddingCache, AnswerCache, normalize_query
+from .chunking import iter_chunks
+from .ivf import IVFIndex, load_or_build_ivf
+from .lexical import BM25Index, hybrid_search, tokenize
+from .prompt import build_grounded_messages, pack_context, estimate_tokens
+from .providers import (
+    EmbeddingProvider,
+    OpenAIEmbeddingProvider,
+    LocalEmbeddingProvider,
+    HashEmbeddingProvider,
+    create_provider
+)
+from .quantize import QuantizedMatrix
+from .singleflight import SingleFlight
+from .shared import publish_index, load_shared_index, current_version, publish_lock
+from .store import (
+    VectorStore,
+    CombinedIndex,
+    normalize_rows,
+    normalize_vector,
+    top_k_indices,
+    save_store,
+    load_store,
+    migrate_json_store,
+    remove_store,
+    update_store,
+    content_hash
+)
+
+__all__ = [
+    'embed_in_batches',
+    'EmbeddingBatcher',
+    'EmbeddingCache',
+    'AnswerCache',
+    'normalize_query',
+    'iter_chunks',
+    'IVFIndex',
+    'load_or_build_ivf',
+    'BM25Index',
+    'hybrid_search',
+    'tokenize',
+    'build_grounded_messages',
+    'pack_context',
+    'estimate_tokens',
+    'EmbeddingProvider',
+    'OpenAIEmbeddingProvider',
+    'LocalEmbeddingProvider',
+    'HashEmbeddingProvider',
+    'create_provider',
+    'QuantizedMatrix',
+    'SingleFlight',
+    'publish_index',
+    'load_shared_index',
+    'current_version',
+    'publish_lock',
+    'VectorStore',
+    'CombinedIndex',
+    'normalize_rows',
+    'normalize_vector',
+    'top_k_indices',
+    'save_store',
+    'load_store',
+    'migrate_json_store',
+    'remove_store',
+    'update_store',
+    'content_hash'
+]
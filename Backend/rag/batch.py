@@ -0,0 +1,135 @@
+# rag/batch.py
+import time
+import random
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Set, Tuple, Type
+
+logger = logging.getLogger(__name__)
+
+
+def _with_retries(call: Callable, max_retries: int, backoff: float,
+    retry_on: Tuple[Type[BaseException], ...]):
+    """Run call(), retrying retry_on errors with exponential backoff and jitter"""
+    for attempt in range(max_retries + 1):
+        try:
+            return call()
+        except retry_on as e:
+            if attempt == max_retries:
+                raise
+            delay = backoff * (2 ** attempt) * (1 + random.random())
+            logger.warning(f"Embedding batch failed ({e}); retry {attempt + 1}/{max_retries} in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def embed_in_batches(texts: Sequence[str],
+    embed_many: Callable[[List[str]], List[List[float]]],
+    batch_size: int = 256,
+    concurrency: int = 4,
+    max_retries: int = 5,
+    backoff: float = 0.5,
+    retry_on: Tuple[Type[BaseException], ...] = (Exception,),
+    progress: Optional[Callable[[int, int], None]] = None) -> List[List[float]]:
+    """Embed texts with multi-input requests, at most `concurrency` in flight
+
+    embed_many receives one batch and must return its vectors in input
+    order. progress(done, total) is called as batches complete. Results
+    come back in the order of texts.
+    """
+    texts = list(texts)
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    results: List[Optional[List[List[float]]]] = [None] * len(batches)
+    done = 0
+
+    def run(i: int):
+        vectors = _with_retries(lambda: embed_many(batches[i]), max_retries, backoff, retry_on)
+        if len(vectors) != len(batches[i]):
+            raise ValueError(f"Expected {len(batches[i])} embeddings, got {len(vectors)}")
+        return i, vectors
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        for i, vectors in pool.map(run, range(len(batches))):
+            results[i] = vectors
+            done += len(vectors)
+            if progress:
+                progress(done, len(texts))
+
+    return [vector for batch in results for vector in batch]
+
+
+class EmbeddingBatcher:
+    """Micro-batches concurrent single-query embeddings into multi-input requests
+
+    Texts passed to embed() within max_wait seconds of the first pending
+    one (or until max_batch are pending) are sent as one aembed_many()
+    call; every caller gets its own vector back. Duplicate texts in a
+    batch are embedded once. A failed request fails every caller in it.
+    """
+
+    def __init__(self, aembed_many: Callable[[List[str]], Awaitable[List[List[float]]]],
+        max_batch: int = 32, max_wait: float = 0.005):
+        self.aembed_many = aembed_many
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # The loop only keeps weak references to tasks; hold in-flight sends until done
+        self._tasks: Set[asyncio.Task] = set()
+        self._batches = 0
+        self._texts = 0
+        self._largest = 0
+
+    async def embed(self, text: str) -> Any:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Pending futures belong to one event loop; start over on a new one
+            self._loop, self._pending, self._timer = loop, [], None
+
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        self._batches += 1
+        self._texts += len(batch)
+        self._largest = max(self._largest, len(batch))
+        try:
+            vectors = await self.aembed_many(texts)
+            if len(vectors) != len(texts):
+                raise ValueError(f"Expected {len(texts)} embeddings, got {len(vectors)}")
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        by_text = dict(zip(texts, vectors))
+        for text, future in batch:
+            # Callers that were cancelled meanwhile are skipped
+            if not future.done():
+                future.set_result(by_text[text])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self._batches,
+            "texts": self._texts,
+            "largest_batch": self._largest,
+            "avg_batch": self._texts / self._batches if self._batches else 0.0
+        }
@@ -0,0 +1,180 @@
+# rag/bench.py
+"""Benchmark harness for the RAG retrieval path
+
+Builds synthetic stores of configurable size and dimension, then times
+every search mode end to end (fake query embedding + search) and reports
+latency percentiles, throughput, index memory and recall@k against exact
+search. Example:
+
+    python -m rag.bench --sizes 1000 100000 1000000 --dims 384 --k 5
+"""
+import json
+import time
+import argparse
+import resource
+import numpy as np
+from typing import Any, Dict, List, Optional
+
+from rag.ivf import IVFIndex
+from rag.providers import EmbeddingProvider
+from rag.reduction import PCAProjection, recall_at_k
+from rag.store import VectorStore, normalize_rows, normalize_vector, top_k_indices
+
+MODES = ("loop", "exact", "float16", "int8", "pca", "ivf", "ivf+int8")
+
+# Rows generated per block when building synthetic matrices
+_BLOCK = 65536
+
+
+class QueryTableProvider(EmbeddingProvider):
+    """Fake provider returning precomputed vectors, so timings exclude any model"""
+
+    def __init__(self, vectors: Dict[str, np.ndarray]):
+        self.vectors = vectors
+        self.model_id = "bench-table"
+
+    def embed_many(self, texts: List[str]) -> List[np.ndarray]:
+        return [self.vectors[text] for text in texts]
+
+
+def synthetic_matrix(n_rows: int, dims: int, clusters: Optional[int] = None,
+    noise: float = 0.6, seed: int = 0) -> np.ndarray:
+    """Unit rows scattered around random topic centres, like passages of a knowledge base"""
+    rng = np.random.default_rng(seed)
+    clusters = clusters or max(1, int(np.sqrt(n_rows)))
+    centres = normalize_rows(rng.standard_normal((clusters, dims), dtype=np.float32))
+
+    matrix = np.empty((n_rows, dims), dtype=np.float32)
+    for start in range(0, n_rows, _BLOCK):
+        count = min(_BLOCK, n_rows - start)
+        block = centres[rng.integers(0, clusters, count)]
+        block += rng.standard_normal((count, dims), dtype=np.float32) * (noise / np.sqrt(dims))
+        matrix[start:start + count] = normalize_rows(block)
+    return matrix
+
+
+def synthetic_queries(matrix: np.ndarray, n_queries: int, noise: float = 0.3, seed: int = 1) -> np.ndarray:
+    """Paraphrase-like queries: stored rows plus noise"""
+    rng = np.random.default_rng(seed)
+    rows = matrix[rng.integers(0, len(matrix), n_queries)]
+    dims = matrix.shape[1]
+    return normalize_rows(rows + rng.standard_normal(rows.shape, dtype=np.float32) * (noise / np.sqrt(dims)))
+
+
+def _legacy_loop_search(matrix: np.ndarray, query: np.ndarray, k: int) -> List[int]:
+    """The original per-item Python cosine loop, as a baseline"""
+    scores = []
+    for row in matrix:
+        denominator = np.linalg.norm(query) * np.linalg.norm(row)
+        scores.append(float(np.dot(query, row) / denominator) if denominator else 0.0)
+    return top_k_indices(np.array(scores), k).tolist()
+
+
+def _build(matrix: np.ndarray, mode: str, args) -> VectorStore:
+    store = VectorStore("bench", [""] * len(matrix), matrix, normalized=True)
+    if mode == "pca":
+        store.reduce(PCAProjection.fit([matrix], args.pca_dims), rerank=args.rerank)
+    if mode in ("ivf", "ivf+int8"):
+        store.ann = IVFIndex.build(matrix, nlist=args.nlist)
+    if mode in ("float16", "int8", "ivf+int8"):
+        store.quantize("float16" if mode == "float16" else "int8", rerank=args.rerank)
+    return store
+
+
+def _index_bytes(store: VectorStore) -> int:
+    """Memory scanned per query: the quantized/reduced copy if any, else the float32 matrix"""
+    if store.quantized is not None:
+        size = store.quantized.nbytes
+    elif store.reduced is not None:
+        size = store.reduced.nbytes
+    else:
+        size = store.matrix.nbytes
+    if store.ann is not None:
+        size += store.ann.centroids.nbytes + store.ann.order.nbytes + store.ann.offsets.nbytes
+    return size
+
+
+def run_mode(matrix: np.ndarray, mode: str, provider: EmbeddingProvider, query_texts: List[str],
+    exact: List[List[int]], args) -> Dict[str, Any]:
+    started = time.perf_counter()
+    store = _build(matrix, mode, args) if mode != "loop" else None
+    build_seconds = time.perf_counter() - started
+
+    latencies, results = [], []
+    for text in query_texts:
+        t0 = time.perf_counter()
+        query = normalize_vector(provider.embed(text))
+        if store is None:
+            rows = _legacy_loop_search(matrix, query, args.k)
+        else:
+            nprobe = args.nprobe if store.ann is not None else None
+            rows = [row for row, _ in store.search(query, args.k, nprobe)]
+        latencies.append(time.perf_counter() - t0)
+        results.append(rows)
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "mode": mode,
+        "rows": len(matrix),
+        "dims": matrix.shape[1],
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+        "qps": float(len(latencies) / np.sum(latencies)),
+        "index_mb": (_index_bytes(store) if store is not None else matrix.nbytes) / 2**20,
+        "build_s": build_seconds,
+        f"recall@{args.k}": recall_at_k(exact[:len(results)], results)
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    parser = argparse.ArgumentParser(description="Benchmark RAG retrieval modes on synthetic stores")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--dims", type=int, default=384)
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=MODES)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--nlist", type=int, default=None, help="IVF lists (default sqrt(rows))")
+    parser.add_argument("--nprobe", type=int, default=8)
+    parser.add_argument("--rerank", type=int, default=4)
+    parser.add_argument("--pca-dims", type=int, default=128)
+    parser.add_argument("--loop-max-rows", type=int, default=20000,
+        help="skip the slow legacy loop above this many rows")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    results = []
+    header = f"{'rows':>9} {'mode':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'qps':>9} {'index MB':>9} {'build s':>8} {'recall':>7}"
+    print(header)
+    for size in args.sizes:
+        matrix = synthetic_matrix(size, args.dims)
+        queries = synthetic_queries(matrix, args.queries)
+        query_texts = [f"query-{i}" for i in range(len(queries))]
+        provider = QueryTableProvider(dict(zip(query_texts, queries)))
+        exact = [top_k_indices(matrix @ query, args.k).tolist() for query in queries]
+
+        for mode in args.modes:
+            if mode == "loop" and size > args.loop_max_rows:
+                continue
+            if mode == "pca" and args.pca_dims >= args.dims:
+                continue
+            texts = query_texts[:20] if mode == "loop" else query_texts
+            result = run_mode(matrix, mode, provider, texts, exact, args)
+            results.append(result)
+            print(
+                f"{size:>9} {mode:>9} {result['p50_ms']:>8.3f} {result['p95_ms']:>8.3f} "
+                f"{result['p99_ms']:>8.3f} {result['qps']:>9.1f} {result['index_mb']:>9.1f} "
+                f"{result['build_s']:>8.2f} {result[f'recall@{args.k}']:>7.3f}"
+            )
+
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"peak RSS: {peak_mb:.0f} MB")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "peak_rss_mb": peak_mb, "results": results}, f, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+# rag/cache.py
+import json
+import asyncio
+import logging
+import time
+import hashlib
+import sqlite3
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(text: str) -> str:
+    """Cache key form of a query: lowercased with whitespace collapsed"""
+    return " ".join(text.lower().split())
+
+
+class EmbeddingCache:
+    """Query-embedding cache: bounded in-memory LRU with optional TTL and SQLite tier
+
+    Memory misses fall through to the SQLite file (if configured) so cached
+    embeddings survive restarts; disk hits are promoted back into memory.
+    Every db_prune_every writes, expired rows and the oldest rows beyond
+    db_max_entries (0 = no limit) are deleted. SQLite errors (e.g. the file
+    locked by another worker) are logged and treated as misses.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = None,
+        db_path: Optional[str] = None, db_max_entries: int = 100000, db_prune_every: int = 256):
+        self.max_entries = max_entries
+        self.ttl = ttl or None
+        self.db_max_entries = db_max_entries
+        self._db_prune_every = max(1, db_prune_every)
+        self._db_writes = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+
+        self._db = None
+        # The SQLite connection has its own lock, so memory hits never wait on disk I/O
+        self._db_lock = threading.Lock()
+        if db_path:
+            try:
+                self._db = sqlite3.connect(db_path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                    "key TEXT PRIMARY KEY, vector BLOB NOT NULL, created REAL NOT NULL)"
+                )
+                self._db.execute(
+                    "CREATE INDEX IF NOT EXISTS query_embeddings_created ON query_embeddings (created)"
+                )
+                self._prune_disk()
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Query cache database unavailable, using memory only: {e}")
+                self._db = None
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def _memory_get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                vector, created = entry
+                if not self._expired(created):
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return vector
+                del self._entries[key]
+            if self._db is None:
+                self._misses += 1
+            return None
+
+    def _disk_get(self, key: str) -> Optional[np.ndarray]:
+        try:
+            with self._db_lock:
+                row = self._db.execute(
+                    "SELECT vector, created FROM query_embeddings WHERE key = ?", (key,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Query cache read failed: {e}")
+            row = None
+        with self._lock:
+            if row is not None and not self._expired(row[1]):
+                vector = np.frombuffer(row[0], dtype=np.float32)
+                self._store_in_memory(key, vector, row[1])
+                self._disk_hits += 1
+                return vector
+            self._misses += 1
+            return None
+
+    def _disk_put(self, key: str, vector: np.ndarray, created: float) -> None:
+        with self._db_lock:
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO query_embeddings (key, vector, created) VALUES (?, ?, ?)",
+                    (key, vector.tobytes(), created)
+                )
+                self._db_writes += 1
+                if self._db_writes % self._db_prune_every == 0:
+                    self._prune_disk()
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Query cache write failed: {e}")
+                self._db.rollback()
+
+    def _prune_disk(self) -> None:
+        """Delete expired rows, then the oldest rows beyond db_max_entries (caller holds _db_lock)"""
+        if self.ttl is not None:
+            self._db.execute("DELETE FROM query_embeddings WHERE created < ?", (time.time() - self.ttl,))
+        if self.db_max_entries > 0:
+            self._db.execute(
+                "DELETE FROM query_embeddings WHERE key IN ("
+                "SELECT key FROM query_embeddings ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                (self.db_max_entries,)
+            )
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        vector = self._memory_get(key)
+        if vector is None and self._db is not None:
+            vector = self._disk_get(key)
+        return vector
+
+    async def aget(self, key: str) -> Optional[np.ndarray]:
+        """get() for the event loop: only the SQLite lookup runs on a worker thread"""
+        vector = self._memory_get(key)
+        if vector is None and self._db is not None:
+            vector = await asyncio.to_thread(self._disk_get, key)
+        return vector
+
+    def put(self, key: str, vector) -> None:
+        vector = np.asarray(vector, dtype=np.float32)
+        created = time.time()
+        with self._lock:
+            self._store_in_memory(key, vector, created)
+        if self._db is not None:
+            self._disk_put(key, vector, created)
+
+    async def aput(self, key: str, vector) -> None:
+        """put() for the event loop: the SQLite write (and its commit) runs on a worker thread"""
+        vector = np.asarray(vector, dtype=np.float32)
+        created = time.time()
+        with self._lock:
+            self._store_in_memory(key, vector, created)
+        if self._db is not None:
+            await asyncio.to_thread(self._disk_put, key, vector, created)
+
+    def _store_in_memory(self, key: str, vector: np.ndarray, created: float) -> None:
+        self._entries[key] = (vector, created)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        if self._db is not None:
+            with self._db_lock:
+                try:
+                    self._db.execute("DELETE FROM query_embeddings")
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.warning(f"Query cache clear failed: {e}")
+                    self._db.rollback()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._disk_hits + self._misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self._hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "hit_rate": (self._hits + self._disk_hits) / lookups if lookups else 0.0
+            }
+
+
+class AnswerCache:
+    """LLM answer cache keyed on the normalized prompt, scoped to the model parameters
+
+    Entries are only valid for one set of parameters (model, temperature,
+    system prompt, ...): a lookup with different parameters clears the
+    cache. With semantic_threshold set, an exact miss can still reuse the
+    answer of a cached prompt whose embedding has cosine similarity at or
+    above the threshold. max_entries <= 0 disables the cache; a ttl of 0 or
+    None keeps answers until they are evicted or invalidated.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: Optional[float] = None,
+        semantic_threshold: Optional[float] = None):
+        self.max_entries = max(0, max_entries)
+        self.ttl = ttl or None
+        self.semantic_threshold = semantic_threshold or None
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._fingerprint: Optional[str] = None
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._semantic_hits = 0
+        self._misses = 0
+        self._invalidations = 0
+
+        # Unit query vectors by slot, for the semantic lookup
+        self._vectors: Optional[np.ndarray] = None
+        self._slot_keys: list = [None] * self.max_entries
+        self._free_slots = list(range(self.max_entries - 1, -1, -1))
+
+    @staticmethod
+    def fingerprint(params: Dict[str, Any]) -> str:
+        return hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def _check_params(self, params: Dict[str, Any]) -> None:
+        fingerprint = self.fingerprint(params)
+        if fingerprint != self._fingerprint:
+            if self._fingerprint is not None:
+                self._invalidations += 1
+            self._clear()
+            self._fingerprint = fingerprint
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def _remove(self, key: str) -> None:
+        _, _, slot = self._entries.pop(key)
+        if slot is not None:
+            self._slot_keys[slot] = None
+            self._free_slots.append(slot)
+
+    def _semantic_match(self, query_vector) -> Optional[str]:
+        if self._vectors is None or len(self._free_slots) == self.max_entries:
+            return None
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        if query_vector.shape[0] != self._vectors.shape[1]:
+            return None
+        norm = np.linalg.norm(query_vector)
+        if not norm:
+            return None
+
+        scores = self._vectors @ (query_vector / norm)
+        for slot in np.argsort(scores)[::-1]:
+            if scores[slot] < self.semantic_threshold:
+                break
+            key = self._slot_keys[slot]
+            if key is None:
+                continue
+            if self._expired(self._entries[key][1]):
+                self._remove(key)
+                continue
+            return key
+        return None
+
+    def get(self, prompt: str, params: Dict[str, Any], query_vector=None) -> Optional[str]:
+        key = normalize_query(prompt)
+        with self._lock:
+            if not self.max_entries:
+                self._misses += 1
+                return None
+            self._check_params(params)
+
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry[1]):
+                self._remove(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[0]
+
+            if self.semantic_threshold and query_vector is not None:
+                match = self._semantic_match(query_vector)
+                if match is not None:
+                    self._entries.move_to_end(match)
+                    self._semantic_hits += 1
+                    return self._entries[match][0]
+
+            self._misses += 1
+            return None
+
+    def put(self, prompt: str, params: Dict[str, Any], answer: str, query_vector=None) -> None:
+        if not self.max_entries:
+            return
+        key = normalize_query(prompt)
+        with self._lock:
+            self._check_params(params)
+            if key in self._entries:
+                self._remove(key)
+            while len(self._entries) >= self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+            slot = None
+            if self.semantic_threshold and query_vector is not None:
+                query_vector = np.asarray(query_vector, dtype=np.float32)
+                norm = np.linalg.norm(query_vector)
+                if self._vectors is None:
+                    self._vectors = np.zeros((self.max_entries, query_vector.shape[0]), dtype=np.float32)
+                if norm and query_vector.shape[0] == self._vectors.shape[1]:
+                    slot = self._free_slots.pop()
+                    self._vectors[slot] = query_vector / norm
+                    self._slot_keys[slot] = key
+
+            self._entries[key] = (answer, time.time(), slot)
+
+    def _clear(self) -> None:
+        self._entries.clear()
+        self._slot_keys = [None] * self.max_entries
+        self._free_slots = list(range(self.max_entries - 1, -1, -1))
+        if self._vectors is not None:
+            self._vectors[:] = 0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._semantic_hits + self._misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self._hits,
+                "semantic_hits": self._semantic_hits,
+                "misses": self._misses,
+                "invalidations": self._invalidations,
+                "hit_rate": (self._hits + self._semantic_hits) / lookups if lookups else 0.0
+            }
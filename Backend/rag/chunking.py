@@ -0,0 +1,99 @@
+# rag/chunking.py
+from collections import deque
+from typing import Iterable, Iterator, List
+
+CHUNK_MODES = ("line", "paragraph", "heading", "window")
+
+
+def _read_lines(path: str) -> Iterator[str]:
+    """Stripped lines of a text file, read lazily"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            yield line.strip()
+
+
+def _split_words(words: List[str], max_tokens: int, overlap: int) -> Iterator[List[str]]:
+    """Windows of at most max_tokens words, consecutive windows sharing `overlap` words"""
+    step = max(1, max_tokens - overlap)
+    for start in range(0, len(words), step):
+        yield words[start:start + max_tokens]
+        if start + max_tokens >= len(words):
+            break
+
+
+def _blocks(lines: Iterable[str], mode: str) -> Iterator[List[str]]:
+    """Group lines into blocks: paragraphs (blank-line separated) or heading sections"""
+    block: List[str] = []
+    for line in lines:
+        if mode == "paragraph" and not line:
+            if block:
+                yield block
+                block = []
+            continue
+        if mode == "heading" and line.startswith("#") and block:
+            yield block
+            block = []
+        if line:
+            block.append(line.lstrip("#").strip() if mode == "heading" and line.startswith("#") else line)
+    if block:
+        yield block
+
+
+def _sized(blocks: Iterable[List[str]], min_tokens: int, max_tokens: int, overlap: int) -> Iterator[str]:
+    """Merge blocks shorter than min_tokens into the next one, split ones longer than max_tokens"""
+    pending: List[str] = []
+    for block in blocks:
+        pending.extend(" ".join(block).split())
+        if len(pending) < min_tokens:
+            continue
+        for window in _split_words(pending, max_tokens, overlap):
+            yield " ".join(window)
+        pending = []
+    if pending:
+        yield " ".join(pending)
+
+
+def _windows(lines: Iterable[str], max_tokens: int, overlap: int) -> Iterator[str]:
+    """Sliding window over the word stream, ignoring line and paragraph breaks"""
+    window: deque = deque()
+    fresh = 0
+    step = max(1, max_tokens - overlap)
+    for line in lines:
+        for word in line.split():
+            window.append(word)
+            fresh += 1
+            if len(window) == max_tokens:
+                yield " ".join(window)
+                for _ in range(step):
+                    window.popleft()
+                fresh = 0
+    if fresh:
+        yield " ".join(window)
+
+
+def iter_chunks(path: str, mode: str = "line", min_tokens: int = 0,
+    max_tokens: int = 200, overlap: int = 0) -> Iterator[str]:
+    """Stream the document chunks of a knowledge file
+
+    Modes:
+      line      - every non-empty line is a chunk (the original behaviour)
+      paragraph - blank-line separated paragraphs
+      heading   - sections starting at "#" heading lines
+      window    - fixed windows of max_tokens words with `overlap` shared words
+
+    For paragraph/heading, blocks under min_tokens are merged with the
+    following block and blocks over max_tokens are split into overlapping
+    windows. Tokens are approximated by whitespace-separated words. The
+    file is read line by line, so only the current chunk is held in memory.
+    """
+    if mode not in CHUNK_MODES:
+        raise ValueError(f"Unknown chunk mode '{mode}', expected one of {CHUNK_MODES}")
+    if not 0 <= overlap < max_tokens:
+        raise ValueError("overlap must be >= 0 and smaller than max_tokens")
+
+    lines = _read_lines(path)
+    if mode == "line":
+        return (line for line in lines if line)
+    if mode == "window":
+        return _windows(lines, max_tokens, overlap)
+    return _sized(_blocks(lines, mode), min_tokens, max_tokens, overlap)
@@ -0,0 +1,115 @@
+# rag/ivf.py
+import os
+import numpy as np
+from typing import Optional
+
+from rag.store import normalize_rows, top_k_indices, corpus_fingerprint, _replace_atomically
+
+# Rows scored per block when assigning the full store to centroids
+_ASSIGN_BLOCK = 65536
+
+
+class IVFIndex:
+    """Inverted-file ANN index over a store's unit-normalized rows
+
+    Rows are clustered with spherical k-means into nlist lists. A query
+    scores the centroids, probes the nprobe closest lists and ranks only
+    their rows exactly, so nprobe trades recall for latency
+    (nprobe == nlist is equivalent to exact search).
+    """
+
+    def __init__(self, centroids: np.ndarray, order: np.ndarray, offsets: np.ndarray,
+        fingerprint: Optional[str] = None):
+        self.centroids = centroids
+        # Row ids grouped by list: list i is order[offsets[i]:offsets[i + 1]]
+        self.order = order
+        self.offsets = offsets
+        # Identifies the store (model + contents) whose row ids the lists hold
+        self.fingerprint = fingerprint
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, matrix: np.ndarray, nlist: Optional[int] = None,
+        iterations: int = 10, sample_per_list: int = 256, seed: int = 0) -> "IVFIndex":
+        """Train centroids on a sample of the rows, then assign every row to a list"""
+        n_rows = len(matrix)
+        nlist = max(1, min(nlist or int(np.sqrt(n_rows)), n_rows))
+        rng = np.random.default_rng(seed)
+
+        sample_size = min(n_rows, nlist * sample_per_list)
+        sample = np.asarray(matrix[np.sort(rng.choice(n_rows, sample_size, replace=False))])
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            counts = np.bincount(assign, minlength=nlist)
+
+            # Reseed empty lists from random sample rows
+            empty = counts == 0
+            if empty.any():
+                sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+            centroids = normalize_rows(sums)
+
+        assign = np.concatenate([
+            np.argmax(np.asarray(matrix[start:start + _ASSIGN_BLOCK]) @ centroids.T, axis=1)
+            for start in range(0, n_rows, _ASSIGN_BLOCK)
+        ])
+        order = np.argsort(assign, kind="stable").astype(np.int64)
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=nlist))]).astype(np.int64)
+        return cls(centroids, order, offsets)
+
+    def candidates(self, query_vector: np.ndarray, nprobe: int) -> np.ndarray:
+        """Row ids in the nprobe lists whose centroids are closest to the query"""
+        probes = top_k_indices(self.centroids @ query_vector, max(1, nprobe))
+        return np.concatenate([self.order[self.offsets[i]:self.offsets[i + 1]] for i in probes])
+
+    def save(self, path: str) -> None:
+        _replace_atomically(
+            path,
+            lambda f: np.savez(
+                f, centroids=self.centroids, order=self.order, offsets=self.offsets,
+                fingerprint=np.array(self.fingerprint or "")
+            )
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "IVFIndex":
+        with np.load(path, allow_pickle=False) as data:
+            fingerprint = str(data["fingerprint"]) if "fingerprint" in data.files else ""
+            return cls(data["centroids"], data["order"], data["offsets"], fingerprint or None)
+
+
+def ivf_path(store_dir: str, source: str) -> str:
+    return os.path.join(store_dir, f"{source}.ivf.npz")
+
+
+def load_or_build_ivf(store_dir: str, store, nlist: Optional[int] = None) -> IVFIndex:
+    """Reuse the saved index if it was built on this store's contents, otherwise train and save one
+
+    Matching the row count is not enough: another worker may have rewritten
+    the store with as many rows, so the saved row ids must come from a store
+    with the same model and content hashes (see corpus_fingerprint()).
+    """
+    path = ivf_path(store_dir, store.source)
+    fingerprint = corpus_fingerprint([store])
+    if os.path.exists(path):
+        try:
+            index = IVFIndex.load(path)
+            if (
+                index.offsets[-1] == len(store)
+                and index.fingerprint == fingerprint
+                and (nlist is None or index.nlist == nlist)
+            ):
+                return index
+        except Exception:
+            pass
+
+    index = IVFIndex.build(store.matrix, nlist=nlist)
+    index.fingerprint = fingerprint
+    index.save(path)
+    return index
@@ -0,0 +1,179 @@
+# rag/lexical.py
+import re
+import math
+import numpy as np
+from typing import Any, Collection, Dict, List, Optional, Tuple
+
+from rag.store import CombinedIndex, VectorStore, top_k_indices
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+# Dropped from queries so "what is VPN" is treated as the keyword query "vpn"
+STOPWORDS = frozenset(
+    "a an and are can do does for from how i in is it me my of on or our please "
+    "tell the to we what when where which who why with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+
+def query_terms(query: str) -> List[str]:
+    """Distinct non-stopword terms of a query, in order"""
+    return list(dict.fromkeys(t for t in tokenize(query) if t not in STOPWORDS))
+
+
+class BM25Index:
+    """In-process inverted index with Okapi BM25 scoring over all store texts
+
+    Documents are the rows of the stores, so lexical hits can be joined
+    with dense hits by (source, row).
+    """
+
+    def __init__(self, stores: Dict[str, VectorStore], k1: float = 1.5, b: float = 0.75):
+        self.stores = [store for store in stores.values() if len(store)]
+
+        doc_store, doc_row, lengths = [], [], []
+        postings: Dict[str, Dict[int, int]] = {}
+        for store_id, store in enumerate(self.stores):
+            for row, text in enumerate(store.texts):
+                doc = len(doc_row)
+                tokens = tokenize(text)
+                for token in tokens:
+                    term_docs = postings.setdefault(token, {})
+                    term_docs[doc] = term_docs.get(doc, 0) + 1
+                doc_store.append(store_id)
+                doc_row.append(row)
+                lengths.append(len(tokens))
+
+        self.doc_store = np.array(doc_store, dtype=np.int32)
+        self.doc_row = np.array(doc_row, dtype=np.int64)
+        n_docs = len(doc_row)
+        lengths = np.array(lengths, dtype=np.float32)
+        avg_length = float(lengths.mean()) if n_docs else 0.0
+
+        self.k1 = k1
+        # Per-document length normalization term of the BM25 denominator
+        self._length_norm = k1 * (1 - b + b * lengths / avg_length) if n_docs else lengths
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self.idf: Dict[str, float] = {}
+        for term, term_docs in postings.items():
+            self.postings[term] = (
+                np.fromiter(term_docs.keys(), dtype=np.int64, count=len(term_docs)),
+                np.fromiter(term_docs.values(), dtype=np.float32, count=len(term_docs))
+            )
+            df = len(term_docs)
+            self.idf[term] = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+
+    def __len__(self) -> int:
+        return len(self.doc_row)
+
+    def _score(self, terms: List[str], sources: Optional[Collection[str]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """BM25 score and number of matched query terms for every document
+
+        Documents outside sources (if given) score zero.
+        """
+        scores = np.zeros(len(self), dtype=np.float32)
+        matched = np.zeros(len(self), dtype=np.int32)
+        for term in terms:
+            if term not in self.postings:
+                continue
+            docs, tf = self.postings[term]
+            scores[docs] += self.idf[term] * tf * (self.k1 + 1) / (tf + self._length_norm[docs])
+            matched[docs] += 1
+
+        if sources is not None:
+            allowed = [i for i, store in enumerate(self.stores) if store.source in sources]
+            excluded = ~np.isin(self.doc_store, allowed)
+            scores[excluded] = 0
+            matched[excluded] = 0
+        return scores, matched
+
+    def _hit(self, doc: int) -> Tuple[VectorStore, int]:
+        return self.stores[self.doc_store[doc]], int(self.doc_row[doc])
+
+    def search_rows(self, query: str, top_k: int = 10,
+        sources: Optional[Collection[str]] = None) -> List[Tuple[float, VectorStore, int]]:
+        """(bm25 score, store, row) of the best lexical matches (within sources), best first"""
+        terms = query_terms(query)
+        if not terms or not len(self):
+            return []
+        scores, _ = self._score(terms, sources)
+        return [
+            (float(scores[doc]), *self._hit(doc))
+            for doc in top_k_indices(scores, top_k)
+            if scores[doc] > 0
+        ]
+
+    def match(self, query: str, max_terms: int = 3, margin: float = 1.25,
+        max_doc_freq: int = 3, sources: Optional[Collection[str]] = None) -> Optional[Dict[str, Any]]:
+        """Confident answer to a short keyword query without any embedding call
+
+        Fires only for queries of 1..max_terms keywords that are each rare
+        (in at most max_doc_freq documents, i.e. names rather than generic
+        words), when the best document contains every keyword and outscores
+        the runner-up by `margin`. Returns {"source", "text", "score",
+        "method": "lexical"} where score is the matched-term coverage (1.0).
+        Only documents of sources (if given) can match.
+        """
+        terms = query_terms(query)
+        if not terms or len(terms) > max_terms or not len(self):
+            return None
+        if any(term not in self.postings or len(self.postings[term][0]) > max_doc_freq for term in terms):
+            return None
+
+        scores, matched = self._score(terms, sources)
+        best, *rest = top_k_indices(scores, 2)
+        if matched[best] < len(terms):
+            return None
+        if rest and scores[rest[0]] * margin > scores[best]:
+            return None
+
+        store, row = self._hit(best)
+        return {"source": store.source, "text": store.texts[row], "score": 1.0, "method": "lexical"}
+
+
+def hybrid_search(combined: CombinedIndex, lexical: BM25Index, query: str, query_vector: np.ndarray,
+    top_k: int = 5, nprobe: Optional[int] = None, min_score: Optional[float] = None,
+    depth: int = 20, rrf_k: int = 60, weights: Optional[Dict[str, float]] = None) -> List[Dict[str, Any]]:
+    """Dense and BM25 candidates fused with reciprocal rank fusion
+
+    Results are ordered by fused rank. "score" stays the cosine similarity
+    (computed for lexical-only candidates too) so thresholds keep their
+    meaning; the fusion value is returned as "fused_score". weights limits
+    both retrievers to the listed sources and scales their cosine scores.
+    """
+    depth = max(depth, top_k)
+    fused: Dict[Tuple[str, int], float] = {}
+    cosine: Dict[Tuple[str, int], float] = {}
+    rows: Dict[Tuple[str, int], Tuple[VectorStore, int]] = {}
+
+    for rank, (score, store, row) in enumerate(combined.search_rows(query_vector, depth, nprobe, weights)):
+        key = (store.source, row)
+        fused[key] = fused.get(key, 0.0) + 1.0 / (rrf_k + rank + 1)
+        cosine[key] = score
+        rows[key] = (store, row)
+
+    for rank, (_, store, row) in enumerate(lexical.search_rows(query, depth, weights)):
+        key = (store.source, row)
+        fused[key] = fused.get(key, 0.0) + 1.0 / (rrf_k + rank + 1)
+        if key not in cosine:
+            weight = weights[store.source] if weights is not None else 1.0
+            cosine[key] = float(store.matrix[row] @ query_vector) * weight
+            rows[key] = (store, row)
+
+    hits = []
+    for key in sorted(fused, key=fused.get, reverse=True):
+        if min_score is not None and cosine[key] < min_score:
+            continue
+        store, row = rows[key]
+        hits.append({
+            "source": store.source,
+            "text": store.texts[row],
+            "score": cosine[key],
+            "fused_score": fused[key]
+        })
+        if len(hits) == top_k:
+            break
+    return hits
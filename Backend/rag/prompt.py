@@ -0,0 +1,70 @@
+# rag/prompt.py
+from typing import Any, Dict, List, Tuple
+
+from rag.cache import normalize_query
+
+GROUNDING_INSTRUCTIONS = (
+    "Answer using the context passages below. If they do not contain the answer, "
+    "say so briefly instead of guessing."
+)
+
+# Rough English average; counting this way costs O(len) with no tokenizer dependency
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    """Cut text to about max_tokens, on a word boundary when possible"""
+    limit = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    space = cut.rfind(" ")
+    return (cut[:space] if space > limit // 2 else cut).rstrip() + "..."
+
+
+def pack_context(hits: List[Dict[str, Any]], token_budget: int,
+    max_passage_tokens: int = 200) -> List[Dict[str, Any]]:
+    """Choose passages for the prompt in one pass over score-ordered hits
+
+    Duplicate passages (same normalized text) are skipped, long ones are
+    truncated to max_passage_tokens, and packing stops when the next
+    passage would exceed token_budget.
+    """
+    packed = []
+    seen = set()
+    used = 0
+    for hit in hits:
+        key = normalize_query(hit["text"])
+        if not key or key in seen:
+            continue
+        seen.add(key)
+
+        text = _truncate(" ".join(hit["text"].split()), max_passage_tokens)
+        cost = estimate_tokens(text)
+        if used + cost > token_budget:
+            break
+        used += cost
+        packed.append({**hit, "text": text})
+    return packed
+
+
+def build_grounded_messages(question: str, hits: List[Dict[str, Any]], system_prompt: str,
+    token_budget: int, max_passage_tokens: int = 200) -> Tuple[List[Dict[str, str]], List[Dict[str, Any]]]:
+    """Chat messages with the retrieved passages packed into the system prompt
+
+    Returns the messages and the passages that made it into the budget.
+    """
+    passages = pack_context(hits, token_budget, max_passage_tokens)
+    context = "\n".join(
+        f"[{i}] ({passage['source']}) {passage['text']}"
+        for i, passage in enumerate(passages, start=1)
+    )
+    messages = [
+        {"role": "system", "content": f"{system_prompt}\n\n{GROUNDING_INSTRUCTIONS}\n\nContext:\n{context}"},
+        {"role": "user", "content": question}
+    ]
+    return messages, passages
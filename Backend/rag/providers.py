@@ -0,0 +1,156 @@
+# rag/providers.py
+import re
+import asyncio
+import hashlib
+import threading
+import importlib.util
+import numpy as np
+from typing import List, Optional, Tuple, Type
+
+
+class EmbeddingProvider:
+    """Turns texts into embedding vectors
+
+    Implementations provide embed_many(); the async variant defaults to
+    running it on a worker thread. model_id names the vector space and is
+    stored with every store, so switching providers triggers a rebuild.
+    """
+
+    model_id: str = ""
+    # Errors worth retrying during batched store builds
+    retry_errors: Tuple[Type[BaseException], ...] = (Exception,)
+
+    def warm_up(self) -> None:
+        """Load anything slow (e.g. a local model) ahead of the first request; off the event loop"""
+
+    def embed_many(self, texts: List[str]) -> List[List[float]]:
+        raise NotImplementedError
+
+    async def aembed_many(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.to_thread(self.embed_many, texts)
+
+    def embed(self, text: str) -> List[float]:
+        return self.embed_many([text])[0]
+
+    async def aembed(self, text: str) -> List[float]:
+        return (await self.aembed_many([text]))[0]
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """OpenAI embeddings API
+
+    The sync and async clients are shared and come from the passed-in getters,
+    so a client rebuilt on a new connection pool is picked up on the next call.
+    """
+
+    def __init__(self, get_client, get_async_client, model: str = "text-embedding-3-small",
+        dimensions: Optional[int] = None):
+        from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+
+        self.get_client = get_client
+        self.get_async_client = get_async_client
+        self.model = model
+        self.dimensions = dimensions
+        self.model_id = f"{model}@{dimensions}" if dimensions else model
+        self.retry_errors = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+        self._kwargs = {"dimensions": dimensions} if dimensions else {}
+
+    def _require(self, get_client):
+        client = get_client() if get_client else None
+        if client is None:
+            raise RuntimeError("openai_api_key not set")
+        return client
+
+    def embed_many(self, texts: List[str]) -> List[List[float]]:
+        resp = self._require(self.get_client).embeddings.create(model=self.model, input=texts, **self._kwargs)
+        return [item.embedding for item in sorted(resp.data, key=lambda item: item.index)]
+
+    async def aembed_many(self, texts: List[str]) -> List[List[float]]:
+        resp = await self._require(self.get_async_client).embeddings.create(
+            model=self.model, input=texts, **self._kwargs
+        )
+        return [item.embedding for item in sorted(resp.data, key=lambda item: item.index)]
+
+
+class LocalEmbeddingProvider(EmbeddingProvider):
+    """CPU sentence-transformers model: no network round trip per query
+
+    Needs the optional sentence-transformers package. The model is loaded
+    (and downloaded, then cached by the library) on first use or by
+    warm_up(), never at construction, so importing the app stays fast.
+    """
+
+    def __init__(self, model: str = "sentence-transformers/all-MiniLM-L6-v2",
+        device: str = "cpu", batch_size: int = 64):
+        if importlib.util.find_spec("sentence_transformers") is None:
+            raise RuntimeError(
+                "rag_embedding_provider=local needs the sentence-transformers package "
+                "(pip install sentence-transformers)"
+            )
+
+        self.model_name = model
+        self.device = device
+        self.model = None
+        self.batch_size = batch_size
+        self.model_id = f"local:{model}"
+        self._load_lock = threading.Lock()
+
+    def warm_up(self) -> None:
+        with self._load_lock:
+            if self.model is None:
+                from sentence_transformers import SentenceTransformer
+
+                self.model = SentenceTransformer(self.model_name, device=self.device)
+
+    def embed_many(self, texts: List[str]) -> List[List[float]]:
+        self.warm_up()
+        vectors = self.model.encode(
+            texts, batch_size=self.batch_size, normalize_embeddings=True, show_progress_bar=False
+        )
+        return vectors.tolist()
+
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+class HashEmbeddingProvider(EmbeddingProvider):
+    """Deterministic feature-hashing embeddings for tests and benchmarks
+
+    Words and word bigrams are hashed into `dimensions` signed buckets, so
+    texts sharing words get similar vectors, with no model and no network.
+    """
+
+    def __init__(self, dimensions: int = 256):
+        self.dimensions = dimensions
+        self.model_id = f"hash-{dimensions}"
+
+    def _vector(self, text: str) -> np.ndarray:
+        words = _TOKEN.findall(text.lower())
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_many(self, texts: List[str]) -> List[List[float]]:
+        return [self._vector(text).tolist() for text in texts]
+
+    async def aembed_many(self, texts: List[str]) -> List[List[float]]:
+        # Pure CPU and fast: no point hopping to a thread
+        return self.embed_many(texts)
+
+
+def create_provider(name: str, get_client=None, get_async_client=None, model: str = "text-embedding-3-small",
+    dimensions: Optional[int] = None, local_model: Optional[str] = None) -> EmbeddingProvider:
+    """Build the provider selected by name: openai, local or hash"""
+    name = name.lower()
+    if name == "openai":
+        return OpenAIEmbeddingProvider(get_client, get_async_client, model, dimensions)
+    if name == "local":
+        return LocalEmbeddingProvider(local_model) if local_model else LocalEmbeddingProvider()
+    if name in ("hash", "fake"):
+        return HashEmbeddingProvider(dimensions or 256)
+    raise ValueError(f"Unknown embedding provider '{name}' (expected openai, local or hash)")
@@ -0,0 +1,63 @@
+# rag/quantize.py
+import numpy as np
+from typing import Optional
+
+PRECISIONS = ("float32", "float16", "int8")
+
+# Rows converted back to float32 per block while scoring, bounding temporary memory
+_SCORE_BLOCK = 8192
+
+
+class QuantizedMatrix:
+    """Reduced-precision copy of a store matrix, used for the coarse scan
+
+    float16 halves memory; int8 uses symmetric per-row scalar quantization
+    (row ~= int8_row * scale) and cuts it 4x. Scores are computed block by
+    block in float32, so they approximate the exact cosine similarity.
+    """
+
+    def __init__(self, matrix: np.ndarray, precision: str = "int8"):
+        if precision not in ("float16", "int8"):
+            raise ValueError(f"Unsupported quantized precision '{precision}'")
+        self.precision = precision
+        self.scales: Optional[np.ndarray] = None
+
+        if precision == "float16":
+            self.data = np.asarray(matrix, dtype=np.float16)
+            return
+
+        self.data = np.empty(matrix.shape, dtype=np.int8)
+        self.scales = np.empty(len(matrix), dtype=np.float32)
+        for start in range(0, len(matrix), _SCORE_BLOCK):
+            block = np.asarray(matrix[start:start + _SCORE_BLOCK], dtype=np.float32)
+            scales = np.abs(block).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            self.data[start:start + len(block)] = np.round(block / scales[:, None]).astype(np.int8)
+            self.scales[start:start + len(block)] = scales
+
+    @classmethod
+    def from_arrays(cls, data: np.ndarray, scales: Optional[np.ndarray] = None) -> "QuantizedMatrix":
+        """Wrap already-quantized arrays, e.g. memory-mapped from a published shared index"""
+        quantized = cls.__new__(cls)
+        quantized.precision = "int8" if scales is not None else "float16"
+        quantized.data = data
+        quantized.scales = scales
+        return quantized
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def scores(self, query_vector: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Approximate dot products of query_vector with all rows (or the given rows)"""
+        count = len(self) if rows is None else len(rows)
+        out = np.empty(count, dtype=np.float32)
+        for start in range(0, count, _SCORE_BLOCK):
+            block_rows = slice(start, start + _SCORE_BLOCK) if rows is None else rows[start:start + _SCORE_BLOCK]
+            out[start:start + _SCORE_BLOCK] = self.data[block_rows].astype(np.float32) @ query_vector
+            if self.scales is not None:
+                out[start:start + _SCORE_BLOCK] *= self.scales[block_rows]
+        return out
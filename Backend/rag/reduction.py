@@ -0,0 +1,168 @@
+# rag/reduction.py
+import os
+import glob
+import argparse
+import numpy as np
+from typing import List, Optional, Sequence
+
+from rag.store import normalize_rows, top_k_indices, load_store, corpus_fingerprint, _replace_atomically
+
+
+class PCAProjection:
+    """Linear projection of embeddings onto their top principal components
+
+    Projected vectors are re-normalized, so cosine similarity is still a
+    plain dot product in the reduced space.
+    """
+
+    def __init__(self, mean: np.ndarray, components: np.ndarray, fingerprint: Optional[str] = None):
+        self.mean = mean.astype(np.float32)
+        # (dimensions, n_components)
+        self.components = components.astype(np.float32)
+        # Identifies the corpus (model + contents) the projection was fitted on
+        self.fingerprint = fingerprint
+
+    @property
+    def input_dimensions(self) -> int:
+        return self.components.shape[0]
+
+    @property
+    def dimensions(self) -> int:
+        return self.components.shape[1]
+
+    @classmethod
+    def fit(cls, matrices: Sequence[np.ndarray], n_components: int,
+        max_samples: int = 50000, seed: int = 0) -> "PCAProjection":
+        """Fit on (a sample of) the rows of all matrices together"""
+        rng = np.random.default_rng(seed)
+        total = sum(len(m) for m in matrices)
+        share = min(1.0, max_samples / total) if total else 1.0
+
+        samples = []
+        for matrix in matrices:
+            if not len(matrix):
+                continue
+            take = max(1, int(len(matrix) * share))
+            rows = np.sort(rng.choice(len(matrix), take, replace=False))
+            samples.append(np.asarray(matrix[rows], dtype=np.float32))
+        sample = np.vstack(samples)
+
+        mean = sample.mean(axis=0)
+        centered = sample - mean
+        # Eigenvectors of the d x d covariance: cheap for tall samples
+        eigenvalues, eigenvectors = np.linalg.eigh(centered.T @ centered)
+        order = np.argsort(eigenvalues)[::-1][:n_components]
+        return cls(mean, eigenvectors[:, order])
+
+    def transform(self, vectors) -> np.ndarray:
+        """Project row vectors (or a single vector) and re-normalize"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            projected = (vectors - self.mean) @ self.components
+            norm = np.linalg.norm(projected)
+            return projected / norm if norm else projected
+        return normalize_rows((vectors - self.mean) @ self.components)
+
+    def save(self, path: str) -> None:
+        _replace_atomically(path, lambda f: np.savez(
+            f, mean=self.mean, components=self.components, fingerprint=np.array(self.fingerprint or "")
+        ))
+
+    @classmethod
+    def load(cls, path: str) -> "PCAProjection":
+        with np.load(path, allow_pickle=False) as data:
+            fingerprint = str(data["fingerprint"]) if "fingerprint" in data.files else ""
+            return cls(data["mean"], data["components"], fingerprint or None)
+
+
+def load_or_fit_pca(path: str, matrices: Sequence[np.ndarray], n_components: int,
+    fingerprint: Optional[str] = None) -> Optional[PCAProjection]:
+    """Reuse the projection saved at path if it was fitted on this corpus, otherwise fit and save one
+
+    fingerprint (see corpus_fingerprint()) identifies the corpus; a saved
+    projection from another model or older store contents is refitted.
+    """
+    matrices = [m for m in matrices if len(m)]
+    if not matrices:
+        return None
+    dimensions = matrices[0].shape[1]
+
+    if os.path.exists(path):
+        try:
+            projection = PCAProjection.load(path)
+            if (
+                projection.input_dimensions == dimensions
+                and projection.dimensions == n_components
+                and projection.fingerprint == fingerprint
+            ):
+                return projection
+        except Exception:
+            pass
+
+    projection = PCAProjection.fit(matrices, n_components)
+    projection.fingerprint = fingerprint
+    projection.save(path)
+    return projection
+
+
+# ------------------ RECALL BENCHMARK ------------------
+def recall_at_k(exact: Sequence[Sequence[int]], approx: Sequence[Sequence[int]]) -> float:
+    """Mean fraction of each exact top-k list found in the matching approximate list"""
+    if not exact:
+        return 0.0
+    return float(np.mean([
+        len(set(e) & set(a)) / len(e) if len(e) else 1.0
+        for e, a in zip(exact, approx)
+    ]))
+
+
+def reduction_recall(matrix: np.ndarray, projection: PCAProjection, n_queries: int = 200,
+    k: int = 10, noise: float = 0.05, seed: int = 0) -> float:
+    """recall@k of reduced-dimension search against full-dimension search
+
+    Queries are stored rows with a little Gaussian noise, standing in for
+    real questions that paraphrase stored passages.
+    """
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(matrix), min(n_queries, len(matrix)), replace=False)
+    queries = normalize_rows(
+        np.asarray(matrix[np.sort(rows)]) + rng.normal(scale=noise, size=(len(rows), matrix.shape[1]))
+    )
+
+    reduced = projection.transform(matrix)
+    exact, approx = [], []
+    for query in queries:
+        exact.append(top_k_indices(matrix @ query, k).tolist())
+        approx.append(top_k_indices(reduced @ projection.transform(query), k).tolist())
+    return recall_at_k(exact, approx)
+
+
+def _load_all(store_dir: str) -> List[np.ndarray]:
+    matrices = []
+    for meta_path in sorted(glob.glob(os.path.join(store_dir, "*.meta.json"))):
+        store = load_store(store_dir, os.path.basename(meta_path)[:-len(".meta.json")])
+        if store is not None and len(store):
+            matrices.append(store.matrix)
+    return matrices
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="recall@k of PCA-reduced search vs full-dimension search")
+    parser.add_argument("--store-dir", default="embeddings")
+    parser.add_argument("--dims", type=int, nargs="+", default=[64, 128, 256, 512])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    matrices = _load_all(args.store_dir)
+    if not matrices:
+        raise SystemExit(f"No stores found in {args.store_dir}")
+    corpus = np.vstack(matrices)
+
+    print(f"{len(corpus)} vectors x {corpus.shape[1]} dimensions")
+    for dims in args.dims:
+        if dims >= corpus.shape[1]:
+            continue
+        projection = PCAProjection.fit(matrices, dims)
+        recall = reduction_recall(corpus, projection, n_queries=args.queries, k=args.k)
+        print(f"dims={dims:5d}  recall@{args.k}={recall:.3f}  memory={dims / corpus.shape[1]:.0%}")
@@ -0,0 +1,178 @@
+# rag/shared.py
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+from numpy.lib.format import open_memmap
+from typing import Dict, Optional, Tuple
+
+from rag.quantize import QuantizedMatrix
+from rag.store import VectorStore, content_hash, file_lock, _replace_atomically
+
+SHARED_FORMAT_VERSION = 1
+
+# Published versions kept on disk; older ones are removed (workers still mapping them are unaffected)
+_KEEP_VERSIONS = 2
+
+
+def _current_path(index_dir: str) -> str:
+    return os.path.join(index_dir, "CURRENT")
+
+
+def current_version(index_dir: str) -> Optional[str]:
+    """Version the CURRENT pointer names, or None if nothing is published (one small read)"""
+    try:
+        with open(_current_path(index_dir), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def publish_lock(index_dir: str):
+    """Exclusive lock so only one worker of a node syncs and publishes at a time"""
+    os.makedirs(index_dir, exist_ok=True)
+    return file_lock(os.path.join(index_dir, ".lock"))
+
+
+def _version_of(stores: Dict[str, VectorStore], model: str, precision: Optional[str]) -> str:
+    """Content digest of a set of stores, so an unchanged index is never republished"""
+    parts = [model, precision or "float32"]
+    for source, store in sorted(stores.items()):
+        parts.append(source)
+        parts.extend(store.hashes or [content_hash(text) for text in store.texts])
+    return hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+def publish_index(index_dir: str, stores: Dict[str, VectorStore], model: str,
+    precision: Optional[str] = None) -> str:
+    """Write every store into one read-only index version and point CURRENT at it
+
+    The version directory holds a single stacked float32 matrix (plus the
+    float16/int8 scan copy when precision is given) and a meta.json with
+    each source's row range and texts. It is assembled under a temp name
+    and renamed into place before CURRENT is replaced, so readers only ever
+    see complete versions. Returns the published version.
+    """
+    version = _version_of(stores, model, precision)
+    version_dir = os.path.join(index_dir, version)
+
+    if not os.path.exists(os.path.join(version_dir, "meta.json")):
+        tmp_dir = f"{version_dir}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        ordered = [stores[source] for source in sorted(stores)]
+        count = sum(len(store) for store in ordered)
+        dimensions = max((store.dimensions for store in ordered), default=0)
+
+        sources, offset = [], 0
+        matrix = open_memmap(os.path.join(tmp_dir, "matrix.npy"), mode="w+",
+            dtype=np.float32, shape=(count, dimensions)) if count else None
+        for store in ordered:
+            if len(store):
+                matrix[offset:offset + len(store)] = store.matrix
+            sources.append({
+                "source": store.source,
+                "offset": offset,
+                "count": len(store),
+                "texts": store.texts,
+                "hashes": store.hashes or [content_hash(text) for text in store.texts]
+            })
+            offset += len(store)
+
+        if matrix is not None:
+            matrix.flush()
+            if precision in ("float16", "int8"):
+                quantized = QuantizedMatrix(matrix, precision)
+                np.save(os.path.join(tmp_dir, "scan.npy"), quantized.data, allow_pickle=False)
+                if quantized.scales is not None:
+                    np.save(os.path.join(tmp_dir, "scales.npy"), quantized.scales, allow_pickle=False)
+            del matrix
+
+        meta = {
+            "format": SHARED_FORMAT_VERSION,
+            "version": version,
+            "model": model,
+            "precision": precision if count and precision in ("float16", "int8") else "float32",
+            "count": count,
+            "dimensions": dimensions,
+            "sources": sources
+        }
+        with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+        try:
+            os.rename(tmp_dir, version_dir)
+        except OSError:
+            # Another process published the same version first
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    if current_version(index_dir) != version:
+        _replace_atomically(_current_path(index_dir), lambda f: f.write(version.encode("utf-8")))
+    _remove_old_versions(index_dir, version)
+    return version
+
+
+def _remove_old_versions(index_dir: str, current: str) -> None:
+    versions = [
+        entry for entry in os.listdir(index_dir)
+        if entry != current and os.path.exists(os.path.join(index_dir, entry, "meta.json"))
+    ]
+    versions.sort(key=lambda entry: os.path.getmtime(os.path.join(index_dir, entry)), reverse=True)
+    for entry in versions[_KEEP_VERSIONS - 1:]:
+        shutil.rmtree(os.path.join(index_dir, entry), ignore_errors=True)
+
+
+def _read_index(index_dir: str, version: str) -> Dict[str, VectorStore]:
+    version_dir = os.path.join(index_dir, version)
+    with open(os.path.join(version_dir, "meta.json"), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+
+    if meta.get("format") != SHARED_FORMAT_VERSION:
+        raise ValueError(f"Unsupported shared index format: {meta.get('format')}")
+
+    matrix = scan = scales = None
+    if meta["count"]:
+        matrix = np.load(os.path.join(version_dir, "matrix.npy"), mmap_mode="r", allow_pickle=False)
+        if matrix.shape != (meta["count"], meta["dimensions"]):
+            raise ValueError(f"Shared index {version} is inconsistent")
+        if meta["precision"] != "float32":
+            scan = np.load(os.path.join(version_dir, "scan.npy"), mmap_mode="r", allow_pickle=False)
+        if meta["precision"] == "int8":
+            scales = np.load(os.path.join(version_dir, "scales.npy"), mmap_mode="r", allow_pickle=False)
+
+    stores = {}
+    for entry in meta["sources"]:
+        rows = slice(entry["offset"], entry["offset"] + entry["count"])
+        if not entry["count"]:
+            store = VectorStore(entry["source"], [], [])
+        else:
+            # Slices of the shared mapping: views, never copies
+            store = VectorStore(entry["source"], entry["texts"], matrix[rows], normalized=True)
+            if scan is not None:
+                store.quantized = QuantizedMatrix.from_arrays(
+                    scan[rows], scales[rows] if scales is not None else None
+                )
+        store.model = meta["model"]
+        store.hashes = entry["hashes"]
+        stores[entry["source"]] = store
+    return stores
+
+
+def load_shared_index(index_dir: str, version: Optional[str] = None) -> Tuple[Optional[str], Dict[str, VectorStore]]:
+    """Memory-map a published index (CURRENT by default) as per-source stores
+
+    Returns (version, stores); (None, {}) if nothing has been published.
+    """
+    for attempt in range(2):
+        version = version or current_version(index_dir)
+        if version is None:
+            return None, {}
+        try:
+            return version, _read_index(index_dir, version)
+        except FileNotFoundError:
+            # The version was cleaned up between reading CURRENT and mapping it
+            if attempt:
+                raise
+            version = None
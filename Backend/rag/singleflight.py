@@ -0,0 +1,51 @@
+# rag/singleflight.py
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict
+
+
+class SingleFlight:
+    """Coalesce concurrent identical async calls into one upstream call
+
+    The first caller for a key starts the call as a task; callers arriving
+    while it is in flight await the same task and get its result (or its
+    exception). The task is shielded, so a caller that is cancelled (e.g.
+    a client disconnect) does not cancel the call for the others. Nothing
+    is cached: once the call finishes the next caller starts a new one.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Any, asyncio.Task] = {}
+        self._lock = threading.Lock()
+        self._calls_started = 0
+        self._calls_shared = 0
+
+    async def do(self, key, call: Callable[[], Awaitable[Any]]) -> Any:
+        # Keyed per event loop, since a task can only be awaited from its own loop
+        flight_key = (id(asyncio.get_running_loop()), key)
+        with self._lock:
+            task = self._calls.get(flight_key)
+            if task is None:
+                task = asyncio.ensure_future(call())
+                self._calls[flight_key] = task
+                task.add_done_callback(lambda t: self._finish(flight_key, t))
+                self._calls_started += 1
+            else:
+                self._calls_shared += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, flight_key, task: asyncio.Task) -> None:
+        with self._lock:
+            if self._calls.get(flight_key) is task:
+                del self._calls[flight_key]
+        # Mark the exception as retrieved in case every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "calls": self._calls_started,
+                "shared": self._calls_shared
+            }
@@ -0,0 +1,411 @@
+# rag/store.py
+import os
+import glob
+import json
+import hashlib
+import heapq
+import contextlib
+import tempfile
+import numpy as np
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+STORE_FORMAT_VERSION = 2
+
+# Reads retried when a concurrent save swaps the matrix out from under the sidecar
+_LOAD_ATTEMPTS = 5
+
+
+def normalize_rows(matrix) -> np.ndarray:
+    """Return matrix as float32 with every row scaled to unit length (zero rows stay zero)"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def normalize_vector(vector) -> np.ndarray:
+    """Return vector as float32 scaled to unit length (a zero vector stays zero)"""
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first, without sorting the whole array"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    if k == 1:
+        return np.array([int(np.argmax(scores))], dtype=np.intp)
+    if k < len(scores):
+        idx = np.argpartition(scores, -k)[-k:]
+    else:
+        idx = np.arange(len(scores))
+    return idx[np.argsort(scores[idx])[::-1]]
+
+
+class VectorStore:
+    """Texts of one source with their embeddings held as a unit-normalized float32 matrix"""
+
+    def __init__(self, source: str, texts: Sequence[str], matrix, normalized: bool = False):
+        self.source = source
+        self.texts = list(texts)
+        if self.texts and normalized:
+            # Already unit rows (e.g. a memory-mapped store file): keep it as-is, no copy
+            self.matrix = matrix
+        elif self.texts:
+            self.matrix = normalize_rows(matrix)
+        else:
+            self.matrix = np.zeros((0, 0), dtype=np.float32)
+
+        if len(self.matrix) != len(self.texts):
+            raise ValueError(
+                f"Store '{source}' has {len(self.texts)} texts but {len(self.matrix)} embeddings"
+            )
+
+        # Optional approximate index (rag.ivf.IVFIndex); None means exact search
+        self.ann = None
+        # Optional reduced-dimension scan copy (rag.reduction.PCAProjection applied to matrix)
+        self.projection = None
+        self.reduced = None
+        # Optional float16/int8 scan copy (rag.quantize.QuantizedMatrix) and re-rank factor
+        self.quantized = None
+        self.rerank = 0
+        # Embedding model and per-row content hashes, set when loaded or updated
+        self.model: Optional[str] = None
+        self.hashes: List[str] = []
+
+    @classmethod
+    def from_items(cls, source: str, items: List[Dict[str, Any]]) -> "VectorStore":
+        """Build a store from the legacy [{"text": ..., "embedding": [...]}] layout"""
+        texts = [item["text"] for item in items]
+        matrix = [item["embedding"] for item in items]
+        return cls(source, texts, matrix)
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    @property
+    def dimensions(self) -> int:
+        return self.matrix.shape[1] if len(self.texts) else 0
+
+    def reduce(self, projection, rerank: int = 0) -> None:
+        """Scan a reduced-dimension copy of the matrix (call before quantize())
+
+        With rerank > 0, the top_k * rerank coarse candidates are re-scored
+        exactly against the full float32 matrix; since that stays
+        memory-mapped, only the candidate rows are ever paged in.
+        """
+        self.projection = projection
+        self.reduced = projection.transform(self.matrix) if len(self) else None
+        self.rerank = rerank
+
+    def quantize(self, precision: str, rerank: int = 0) -> None:
+        """Scan a float16/int8 copy of the (possibly reduced) matrix; rerank as for reduce()"""
+        from rag.quantize import QuantizedMatrix
+
+        scan_matrix = self.reduced if self.reduced is not None else self.matrix
+        self.quantized = QuantizedMatrix(scan_matrix, precision) if len(self) else None
+        self.rerank = rerank
+
+    @property
+    def approximate(self) -> bool:
+        """True when scores come from a reduced and/or quantized copy"""
+        return self.quantized is not None or self.reduced is not None
+
+    def _scan(self, query_vector: np.ndarray, rows: Optional[np.ndarray], top_k: int) -> List[Tuple[int, float]]:
+        """Top (row, score) among `rows` (None = all), via the reduced/quantized copy if any"""
+        scan_query = self.projection.transform(query_vector) if self.projection is not None else query_vector
+        if self.quantized is not None:
+            scores = self.quantized.scores(scan_query, rows)
+        else:
+            scan_matrix = self.reduced if self.reduced is not None else self.matrix
+            scores = scan_matrix @ scan_query if rows is None else scan_matrix[rows] @ scan_query
+
+        rerank = self.approximate and self.rerank
+        best = top_k_indices(scores, top_k * self.rerank if rerank else top_k)
+        candidates = best if rows is None else rows[best]
+
+        if rerank:
+            exact = self.matrix[candidates] @ query_vector
+            return [(int(candidates[i]), float(exact[i])) for i in top_k_indices(exact, top_k)]
+
+        return [(int(row), float(scores[i])) for row, i in zip(candidates, best)]
+
+    def search(self, query_vector: np.ndarray, top_k: int = 1,
+        nprobe: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Return (row, score) pairs for the top_k rows of a unit query vector, best first
+
+        With an ANN index attached and nprobe set, only the probed lists are
+        scored; if they hold fewer than top_k rows the search falls back to exact.
+        """
+        if not len(self):
+            return []
+
+        if self.ann is not None and nprobe:
+            rows = self.ann.candidates(query_vector, nprobe)
+            if len(rows) >= min(top_k, len(self)):
+                return self._scan(query_vector, rows, top_k)
+
+        return self._scan(query_vector, None, top_k)
+
+
+class CombinedIndex:
+    """All source stores searched as one corpus, merging each source's top-k
+
+    The per-source matrices are scored in place rather than stacked, so
+    memory-mapped stores stay shared page cache instead of being copied.
+    """
+
+    def __init__(self, stores: Dict[str, VectorStore]):
+        self.stores = [store for store in stores.values() if len(store)]
+
+    def __len__(self) -> int:
+        return sum(len(store) for store in self.stores)
+
+    def search_rows(self, query_vector: np.ndarray, top_k: int = 1, nprobe: Optional[int] = None,
+        weights: Optional[Dict[str, float]] = None) -> List[Tuple[float, VectorStore, int]]:
+        """(score, store, row) for the top_k rows of a unit query vector, best first
+
+        Each source does its own partial selection; the per-source winners
+        are merged with a heap. nprobe is passed to stores that carry an
+        ANN index; None forces exact search. With weights ({source: weight})
+        only the listed sources are searched and their scores are scaled.
+        """
+        candidates = []
+        for store in self.stores:
+            if weights is not None and store.source not in weights:
+                continue
+            weight = weights[store.source] if weights is not None else 1.0
+            for row, score in store.search(query_vector, top_k, nprobe):
+                candidates.append((score * weight, store, row))
+        return heapq.nlargest(top_k, candidates, key=lambda c: c[0])
+
+    def search(self, query_vector, top_k: int = 1, nprobe: Optional[int] = None,
+        min_score: Optional[float] = None, weights: Optional[Dict[str, float]] = None) -> List[Dict[str, Any]]:
+        """Return the top_k rows as {"source", "text", "score"} dicts, best first
+
+        Rows scoring below min_score (after weighting) are dropped.
+        """
+        return [
+            {
+                "source": store.source,
+                "text": store.texts[row],
+                "score": score
+            }
+            for score, store, row in self.search_rows(normalize_vector(query_vector), top_k, nprobe, weights)
+            if min_score is None or score >= min_score
+        ]
+
+
+# ------------------ PERSISTENCE ------------------
+def content_hash(text: str) -> str:
+    """Stable identity of a stored text, used to reuse embeddings across rebuilds"""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def corpus_fingerprint(stores) -> str:
+    """Digest of the stores' embedding model and contents; saved with derived indexes (PCA, IVF)"""
+    parts = []
+    for store in sorted(stores, key=lambda store: store.source):
+        parts.append(f"{store.source}:{store.model}")
+        parts.extend(store.hashes or [content_hash(text) for text in store.texts])
+    return hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+def _meta_path(store_dir: str, source: str) -> str:
+    return os.path.join(store_dir, f"{source}.meta.json")
+
+
+def _matrix_paths(store_dir: str, source: str) -> List[str]:
+    """Every matrix file of a source: <source>.<digest>.npy plus the format-1 <source>.npy"""
+    return glob.glob(os.path.join(glob.escape(store_dir), f"{glob.escape(source)}.*.npy")) + [
+        os.path.join(store_dir, f"{source}.npy")
+    ]
+
+
+def _derived_paths(store_dir: str, source: str):
+    """Indexes built from a store's matrix, stale once the matrix is rewritten"""
+    return (
+        os.path.join(store_dir, f"{source}.ivf.npz"),
+    )
+
+
+@contextlib.contextmanager
+def file_lock(path: str):
+    """Exclusive advisory lock on path, held across processes (no-op without fcntl)"""
+    try:
+        import fcntl
+    except ImportError:
+        # No flock (Windows): single-worker deployments do not need it
+        yield
+        return
+
+    with open(path, "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _replace_atomically(path: str, write) -> None:
+    """Write to a temp file next to path and rename it over path
+
+    The temp name is unique, so several workers rewriting the same file at
+    once each rename a complete file and the last one wins.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=f"{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _remove_files(paths: Sequence[str]) -> None:
+    """Delete files, tolerating ones another worker removed first"""
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def save_store(store_dir: str, store: VectorStore, model: str) -> None:
+    """Persist a store as a raw float32 .npy matrix plus a JSON text/metadata sidecar
+
+    The matrix is written under a content-addressed name and the sidecar,
+    which points at it, is replaced last: readers always see a matching
+    pair, and processes that still map the previous matrix keep it alive.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+
+    hashes = [content_hash(text) for text in store.texts]
+    digest = hashlib.sha1("\n".join([model] + hashes).encode("utf-8")).hexdigest()[:16]
+    matrix_name = f"{store.source}.{digest}.npy"
+
+    matrix = np.ascontiguousarray(store.matrix, dtype=np.float32)
+    meta = {
+        "format": STORE_FORMAT_VERSION,
+        "source": store.source,
+        "model": model,
+        "matrix": matrix_name,
+        "count": len(store),
+        "dimensions": store.dimensions,
+        "texts": store.texts,
+        "hashes": hashes
+    }
+
+    matrix_path = os.path.join(store_dir, matrix_name)
+    # Workers saving the same source at once take turns, so one worker's cleanup
+    # never removes the matrix another worker's sidecar has just been pointed at
+    with file_lock(os.path.join(store_dir, f"{store.source}.lock")):
+        _replace_atomically(matrix_path, lambda f: np.save(f, matrix, allow_pickle=False))
+        _replace_atomically(
+            _meta_path(store_dir, store.source),
+            lambda f: f.write(json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+        )
+
+        stale = [path for path in _matrix_paths(store_dir, store.source) if path != matrix_path]
+        _remove_files(stale + list(_derived_paths(store_dir, store.source)))
+
+
+def _read_store(store_dir: str, source: str) -> Optional[VectorStore]:
+    meta_path = _meta_path(store_dir, source)
+    if not os.path.exists(meta_path):
+        return None
+
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+
+    if meta.get("format") not in (1, STORE_FORMAT_VERSION):
+        raise ValueError(f"Unsupported store format for '{source}': {meta.get('format')}")
+
+    texts = meta["texts"]
+    if not texts:
+        store = VectorStore(source, [], [])
+    else:
+        matrix_path = os.path.join(store_dir, meta.get("matrix", f"{source}.npy"))
+        matrix = np.load(matrix_path, mmap_mode="r", allow_pickle=False)
+        if matrix.shape != (meta["count"], meta["dimensions"]) or len(texts) != meta["count"]:
+            raise ValueError(f"Store files for '{source}' are inconsistent")
+        store = VectorStore(source, texts, matrix, normalized=True)
+
+    store.model = meta.get("model")
+    store.hashes = meta.get("hashes") or [content_hash(text) for text in texts]
+    return store
+
+
+def load_store(store_dir: str, source: str) -> Optional[VectorStore]:
+    """Memory-map a saved store; returns None if it has not been written yet"""
+    for attempt in range(_LOAD_ATTEMPTS):
+        try:
+            return _read_store(store_dir, source)
+        except FileNotFoundError:
+            # A concurrent save replaced the sidecar between reading it and opening the matrix
+            if attempt == _LOAD_ATTEMPTS - 1:
+                raise
+
+
+def migrate_json_store(store_dir: str, source: str, model: str) -> Optional[VectorStore]:
+    """One-time conversion of a legacy <source>.json cache to the binary format"""
+    legacy_path = os.path.join(store_dir, f"{source}.json")
+    if not os.path.exists(legacy_path):
+        return None
+
+    with open(legacy_path, "r", encoding="utf-8") as f:
+        items = json.load(f)
+
+    save_store(store_dir, VectorStore.from_items(source, items), model)
+    return load_store(store_dir, source)
+
+
+def update_store(existing: Optional[VectorStore], source: str, texts: Sequence[str],
+    model: str, embed_texts: Callable[[List[str]], List[List[float]]]) -> Tuple[VectorStore, Dict[str, int]]:
+    """Bring a store in line with texts, embedding only lines whose content hash is new
+
+    Rows of the existing store are reused when it was built with the same
+    model. Returns the new store and counts of added, removed and reused lines.
+    """
+    hashes = [content_hash(text) for text in texts]
+
+    reusable: Dict[str, int] = {}
+    if existing is not None and len(existing) and existing.model in (None, model):
+        reusable = {digest: row for row, digest in enumerate(existing.hashes)}
+
+    missing: Dict[str, str] = {}
+    for text, digest in zip(texts, hashes):
+        if digest not in reusable:
+            missing.setdefault(digest, text)
+
+    new_vectors = dict(zip(missing, embed_texts(list(missing.values())))) if missing else {}
+    vectors = [
+        existing.matrix[reusable[digest]] if digest in reusable else new_vectors[digest]
+        for digest in hashes
+    ]
+
+    store = VectorStore(source, texts, vectors)
+    store.model = model
+    store.hashes = hashes
+
+    kept = set(hashes)
+    stats = {
+        "added": len(missing),
+        "removed": len([digest for digest in reusable if digest not in kept]),
+        "reused": len(set(hashes) - set(missing))
+    }
+    return store, stats
+
+
+def remove_store(store_dir: str, source: str) -> None:
+    """Delete a store's files (used when they are found corrupt)"""
+    paths = [_meta_path(store_dir, source)] + _matrix_paths(store_dir, source)
+    _remove_files(paths + list(_derived_paths(store_dir, source)))
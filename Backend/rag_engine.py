@@ -1,10 +1,41 @@
 import os
-import json
+import time
+import asyncio
+import threading
 import numpy as np
-from openai import OpenAI
+from datetime import datetime
+from openai import OpenAI, AsyncOpenAI
+from db.config import get_database_by_website_source
+from http_client import get_http_client, get_async_http_client
+from rag.batch import embed_in_batches, EmbeddingBatcher
+from rag.chunking import iter_chunks
+from rag.cache import EmbeddingCache, normalize_query
+from rag.ivf import load_or_build_ivf
+from rag.providers import create_provider
+from rag.reduction import load_or_fit_pca, corpus_fingerprint
+from rag.lexical import BM25Index, hybrid_search
+from rag.singleflight import SingleFlight
+from rag.shared import current_version, load_shared_index, publish_index, publish_lock
+from rag.store import (
+    VectorStore,
+    CombinedIndex,
+    normalize_vector,
+    save_store,
+    load_store,
+    migrate_json_store,
+    remove_store,
+    update_store,
+    content_hash
+)
 
 # ------------------ CONFIG ------------------
+# Embedding backend: "openai", "local" (CPU sentence-transformers) or "hash" (deterministic fake)
+EMB_PROVIDER = os.getenv("rag_embedding_provider", "openai").lower()
 EMB_MODEL = "text-embedding-3-small"
+# openai: API-side truncation of text-embedding-3 vectors (e.g. 512), unset keeps the full 1536.
+# hash: vector size (default 256)
+EMB_DIMENSIONS = int(os.getenv("rag_embedding_dimensions", "0")) or None
+EMB_LOCAL_MODEL = os.getenv("rag_local_embedding_model") or None
 DATA_DIR = "data"
 STORE_DIR = "embeddings"
 
@@ -15,21 +46,180 @@ SOURCES = {
     "dataengineering": "dataengineering.txt",
 }
 
+# How data files are split into stored passages (see rag.chunking.iter_chunks).
+# SOURCE_CHUNKING overrides the defaults per source, e.g. {"support": {"mode": "paragraph"}}
+CHUNKING = {
+    "mode": os.getenv("rag_chunk_mode", "line"),
+    "min_tokens": int(os.getenv("rag_chunk_min_tokens", "0")),
+    "max_tokens": int(os.getenv("rag_chunk_max_tokens", "200")),
+    "overlap": int(os.getenv("rag_chunk_overlap", "0")),
+}
+SOURCE_CHUNKING = {}
+
+# Search mode: "exact" scans every row, "ivf" probes an inverted-file ANN index
+INDEX_MODE = os.getenv("rag_index_mode", "exact").lower()
+IVF_NLIST = int(os.getenv("rag_ivf_nlist", "0")) or None  # default: sqrt(rows)
+IVF_NPROBE = int(os.getenv("rag_ivf_nprobe", "8"))  # higher = better recall, slower
+IVF_MIN_ROWS = int(os.getenv("rag_ivf_min_rows", "5000"))  # smaller stores stay exact
+
+# Scan precision: "float32" (exact), "float16" (2x smaller) or "int8" (4x smaller).
+# Quantized scans re-score the top top_k * rag_rerank_factor rows in float32 (0 = off)
+STORE_PRECISION = os.getenv("rag_store_precision", "float32").lower()
+RERANK_FACTOR = int(os.getenv("rag_rerank_factor", "4"))
+
+# Local PCA reduction of the scan vectors (0 = off); the projection is saved as
+# embeddings/pca.npz. Reduced scans re-score their top candidates like quantized ones
+PCA_DIMENSIONS = int(os.getenv("rag_pca_dimensions", "0"))
+
+# Retrieval: "dense" (cosine only) or "hybrid" (dense + BM25 fused by reciprocal rank)
+RETRIEVAL_MODE = os.getenv("rag_retrieval_mode", "dense").lower()
+# Answer short keyword queries ("VPN", "SAP") from the BM25 index without an embedding call
+LEXICAL_FAST_PATH = os.getenv("rag_lexical_fast_path", "true").lower() == "true"
+LEXICAL_MAX_TERMS = int(os.getenv("rag_lexical_max_terms", "3"))
+
+# Multi-worker deployments: every worker syncs the stores under a lock, publishes them
+# as one versioned read-only index and memory-maps it, so all workers of a node share
+# the same page cache. Workers pick up newly published versions within the check interval
+SHARED_INDEX = os.getenv("rag_shared_index", "false").lower() == "true"
+SHARED_INDEX_DIR = os.getenv("rag_shared_index_dir") or os.path.join(STORE_DIR, "shared")
+SHARED_INDEX_CHECK_SECONDS = float(os.getenv("rag_shared_index_check_seconds", "5"))
+
+# Source routing: website_source -> site (db.config.get_database_by_website_source)
+# -> {source: score weight}. Only the listed sources are searched; if none of them
+# clears the threshold the query falls back to all sources. Sites without an entry
+# (e.g. guidance, which has no data file of its own) always search everything
+SOURCE_ROUTING = os.getenv("rag_source_routing", "true").lower() == "true"
+SITE_SOURCE_WEIGHTS = {
+    "itsupport": {"support": 1.0, "company": 0.95, "dataengineering": 0.9},
+    "software": {"software": 1.0, "company": 0.95, "dataengineering": 0.9},
+}
+
+# Query-embedding cache: LRU size, optional TTL (seconds) and optional SQLite file
+# holding at most rag_query_cache_db_size rows (0 = no limit)
+QUERY_CACHE_SIZE = int(os.getenv("rag_query_cache_size", "1024"))
+QUERY_CACHE_TTL = float(os.getenv("rag_query_cache_ttl", "0")) or None
+QUERY_CACHE_DB = os.getenv("rag_query_cache_db") or None
+QUERY_CACHE_DB_SIZE = int(os.getenv("rag_query_cache_db_size", "100000"))
+
+# Store building: inputs per embeddings request, requests in flight, retries per batch
+EMBED_BATCH_SIZE = int(os.getenv("rag_embed_batch_size", "256"))
+EMBED_CONCURRENCY = int(os.getenv("rag_embed_concurrency", "4"))
+EMBED_MAX_RETRIES = int(os.getenv("rag_embed_max_retries", "5"))
+
+# Query embeddings from concurrent requests are sent together: up to
+# rag_query_batch_size texts collected for at most rag_query_batch_wait_ms (size 1 = off)
+QUERY_BATCH_SIZE = int(os.getenv("rag_query_batch_size", "32"))
+QUERY_BATCH_WAIT_MS = float(os.getenv("rag_query_batch_wait_ms", "5"))
+
 # ------------------ CLIENT ------------------
+# Only needed for the openai embedding provider and the chat completions fallback
 API_KEY = os.getenv("openai_api_key")
-if not API_KEY:
-    raise RuntimeError("openai_api_key not set")
 
-client = OpenAI(api_key=API_KEY)
+# openai_base_url lets store builds run against a local/fake embeddings server.
+# Both clients reuse the pooled keep-alive connections of http_client; they are
+# rebuilt whenever that pool is (e.g. after a shutdown/startup cycle closed it)
+_openai_clients = {}
+_openai_lock = threading.Lock()
+
+
+def _openai_client(cls, http_client):
+    if not API_KEY:
+        return None
+    with _openai_lock:
+        cached = _openai_clients.get(cls)
+        if cached is None or cached[0] is not http_client:
+            cached = (http_client, cls(
+                api_key=API_KEY,
+                base_url=os.getenv("openai_base_url") or None,
+                http_client=http_client
+            ))
+            _openai_clients[cls] = cached
+        return cached[1]
+
+
+def get_openai_client():
+    """Blocking OpenAI client bound to the live connection pool (None without an API key)"""
+    return _openai_client(OpenAI, get_http_client("openai"))
+
+
+def get_async_openai_client():
+    """Non-blocking client for request handlers running on the event loop"""
+    return _openai_client(AsyncOpenAI, get_async_http_client("openai"))
+
+
+provider = create_provider(
+    EMB_PROVIDER, get_openai_client, get_async_openai_client,
+    model=EMB_MODEL, dimensions=EMB_DIMENSIONS, local_model=EMB_LOCAL_MODEL
+)
+# Identifies the vector space in store metadata and cache keys
+EMB_MODEL_ID = provider.model_id
+
+query_cache = EmbeddingCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL, QUERY_CACHE_DB, QUERY_CACHE_DB_SIZE)
+# Deduplicates concurrent query-embedding calls (thundering herds on one question)
+embed_flight = SingleFlight()
+query_batcher = EmbeddingBatcher(provider.aembed_many, QUERY_BATCH_SIZE, QUERY_BATCH_WAIT_MS / 1000)
 
 # ------------------ UTILS ------------------
 def embed(text: str):
-    text_lower = text.lower().strip()
-    resp = client.embeddings.create(
-        model=EMB_MODEL,
-        input=text_lower
+    return provider.embed(text.lower().strip())
+
+
+def embed_many(texts):
+    """Embed several texts with one multi-input request, returned in input order"""
+    return provider.embed_many([text.lower().strip() for text in texts])
+
+
+def embed_all(texts, label="texts"):
+    """Embed a whole source in batches with bounded concurrency and retry/backoff"""
+    return embed_in_batches(
+        texts,
+        embed_many,
+        batch_size=EMBED_BATCH_SIZE,
+        concurrency=EMBED_CONCURRENCY,
+        max_retries=EMBED_MAX_RETRIES,
+        retry_on=provider.retry_errors,
+        progress=lambda done, total: print(f"Embedding {label}: {done}/{total}")
     )
-    return resp.data[0].embedding
+
+
+def embed_query(query: str):
+    """embed() for user queries, served from query_cache when the normalized text repeats"""
+    key = f"{EMB_MODEL_ID}:{normalize_query(query)}"
+    vector = query_cache.get(key)
+    if vector is None:
+        vector = np.asarray(embed(query), dtype=np.float32)
+        query_cache.put(key, vector)
+    return vector
+
+
+async def embed_async(text: str):
+    return await provider.aembed(text.lower().strip())
+
+
+async def _embed_and_cache(key: str, query: str):
+    if QUERY_BATCH_SIZE > 1:
+        vector = await query_batcher.embed(query.lower().strip())
+    else:
+        vector = await embed_async(query)
+    vector = np.asarray(vector, dtype=np.float32)
+    await query_cache.aput(key, vector)
+    return vector
+
+
+async def embed_query_async(query: str):
+    """Async embed_query(): same cache, but neither the API call nor the SQLite tier blocks the event loop
+
+    Concurrent misses for the same normalized query share one embeddings call.
+    """
+    key = f"{EMB_MODEL_ID}:{normalize_query(query)}"
+    vector = await query_cache.aget(key)
+    if vector is None:
+        vector = await embed_flight.do(key, lambda: _embed_and_cache(key, query))
+    return vector
+
+
+def query_cache_stats():
+    return query_cache.stats()
 
 
 def cosine(a, b):
@@ -42,89 +232,433 @@ def cosine(a, b):
 # ------------------ LOAD STORE ------------------
 def load_source(source: str, filename: str):
     os.makedirs(STORE_DIR, exist_ok=True)
-    store_file = os.path.join(STORE_DIR, f"{source}.json")
 
-    # Load cached embeddings
-    if os.path.exists(store_file):
+    # Memory-mapped binary store (<source>.meta.json -> <source>.<digest>.npy)
+    store = None
+    try:
+        store = load_store(STORE_DIR, source)
+    except Exception:
+        remove_store(STORE_DIR, source)
+
+    # One-time migration from the legacy <source>.json cache
+    if store is None:
         try:
-            with open(store_file, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                print(f"Loaded {source} embeddings ({len(data)})")
-                return data
+            store = migrate_json_store(STORE_DIR, source, EMB_MODEL)
+            if store is not None:
+                print(f"Migrated {source} embeddings to binary store ({len(store)})")
         except Exception:
-            os.remove(store_file)
+            remove_store(STORE_DIR, source)
+            os.remove(os.path.join(STORE_DIR, f"{source}.json"))
 
-    # Build embeddings
     path = os.path.join(DATA_DIR, filename)
     if not os.path.exists(path):
-        return []
+        return store if store is not None else VectorStore(source, [], [])
 
-    with open(path, "r", encoding="utf-8") as f:
-        lines = [l.strip() for l in f if l.strip()]
+    lines = list(iter_chunks(path, **{**CHUNKING, **SOURCE_CHUNKING.get(source, {})}))
 
-    store = []
-    for line in lines:
-        store.append({
-            "text": line,
-            "embedding": embed(line)
-        })
+    # Unchanged data file: serve the mapped store as-is
+    if store is not None and store.model == EMB_MODEL_ID and store.hashes == [content_hash(l) for l in lines]:
+        print(f"Loaded {source} embeddings ({len(store)})")
+        return store
 
-    with open(store_file, "w", encoding="utf-8") as f:
-        json.dump(store, f, indent=2, ensure_ascii=False)
+    # Re-embed only added/changed lines, then rewrite the store atomically
+    updated, stats = update_store(
+        store, source, lines, EMB_MODEL_ID,
+        lambda texts: embed_all(texts, label=source)
+    )
+    save_store(STORE_DIR, updated, EMB_MODEL_ID)
 
-    print(f"Generated {source} embeddings ({len(store)})")
-    return store
+    print(
+        f"Updated {source} embeddings ({len(updated)}): "
+        f"{stats['added']} added, {stats['removed']} removed, {stats['reused']} reused"
+    )
+    return load_store(STORE_DIR, source)
 
 # ------------------ INIT ALL STORES ------------------
-EMBEDDING_STORES = {
-    source: load_source(source, file)
-    for source, file in SOURCES.items()
+class IndexSnapshot:
+    """One immutable generation of the knowledge base: stores plus the indexes built on them
+
+    Reloads build a new snapshot and replace the module reference in one
+    assignment; a query reads the reference once, so it finishes against
+    the generation it started with.
+    """
+
+    def __init__(self, stores, lexical, generation=0, shared_version=None):
+        self.stores = stores
+        self.combined = CombinedIndex(stores)
+        self.lexical = lexical
+        self.generation = generation
+        self.shared_version = shared_version
+        self.loaded_at = datetime.now().isoformat()
+
+
+# Replaced by init_stores()/reload, normally from a background thread started at app startup
+_snapshot = IndexSnapshot({}, BM25Index({}))
+# Aliases of the current snapshot's parts, kept for existing callers
+EMBEDDING_STORES = _snapshot.stores
+COMBINED_INDEX = _snapshot.combined
+LEXICAL_INDEX = _snapshot.lexical
+
+_init_lock = threading.Lock()
+_init_thread = None
+_init_state = {
+    "status": "not_started",  # not_started | loading | ready | failed
+    "error": None,
+    "started_at": None,
+    "ready_at": None
 }
+# Background rebuilds after startup; a request arriving mid-rebuild queues one more run
+_reload_state = {
+    "running": False,
+    "pending": False,
+    "last_trigger": None,
+    "last_error": None,
+    "last_reload_at": None
+}
+# Shared index version currently mapped, and when CURRENT was last checked
+_shared_state = {"checked_at": 0.0, "refreshing": False}
 
-# ------------------ SEARCH ------------------
-def search_all_sources(query: str, threshold=0.6):
-    q_emb = embed(query)
+# Poll the data files every rag_watch_interval seconds and reload on change (0 = off)
+WATCH_INTERVAL = float(os.getenv("rag_watch_interval", "0"))
+_watch_thread = None
+
+
+def _load_stores():
+    """Per-source stores, plus the shared index version they were mapped from (or None)"""
+    if not SHARED_INDEX:
+        return {source: load_source(source, file) for source, file in SOURCES.items()}, None
+
+    with publish_lock(SHARED_INDEX_DIR):
+        synced = {source: load_source(source, file) for source, file in SOURCES.items()}
+        # The quantized scan copy is shared too, unless PCA makes it per-worker
+        precision = STORE_PRECISION if STORE_PRECISION != "float32" and not PCA_DIMENSIONS else None
+        version = publish_index(SHARED_INDEX_DIR, synced, EMB_MODEL_ID, precision)
+    version, stores = load_shared_index(SHARED_INDEX_DIR, version)
+    return stores, version
+
+
+def _build_indexes(stores):
+    """Attach the configured ANN/PCA/quantized scan structures; returns the BM25 index"""
+    if INDEX_MODE == "ivf":
+        for store in stores.values():
+            if len(store) >= IVF_MIN_ROWS:
+                store.ann = load_or_build_ivf(STORE_DIR, store, IVF_NLIST)
+                print(f"IVF index ready for {store.source} ({store.ann.nlist} lists)")
+
+    if PCA_DIMENSIONS:
+        projection = load_or_fit_pca(
+            os.path.join(STORE_DIR, "pca.npz"),
+            [store.matrix for store in stores.values()],
+            PCA_DIMENSIONS,
+            fingerprint=corpus_fingerprint(stores.values())
+        )
+        if projection is not None:
+            for store in stores.values():
+                store.reduce(projection, rerank=RERANK_FACTOR)
+
+    if STORE_PRECISION != "float32":
+        for store in stores.values():
+            if store.quantized is None:
+                store.quantize(STORE_PRECISION, rerank=RERANK_FACTOR)
+            else:
+                # Mapped from the shared index
+                store.rerank = RERANK_FACTOR
+
+    return BM25Index(stores)
+
+
+def _swap(stores, lexical, shared_version):
+    """Publish a fully built snapshot; the previous one lives on until its queries finish"""
+    global _snapshot, EMBEDDING_STORES, COMBINED_INDEX, LEXICAL_INDEX
+
+    with _init_lock:
+        snapshot = IndexSnapshot(stores, lexical, _snapshot.generation + 1, shared_version)
+        _snapshot = snapshot
+        EMBEDDING_STORES = snapshot.stores
+        COMBINED_INDEX = snapshot.combined
+        LEXICAL_INDEX = snapshot.lexical
+        _shared_state["checked_at"] = time.monotonic()
+    return snapshot
+
+
+def _rebuild():
+    stores, version = _load_stores()
+    return _swap(stores, _build_indexes(stores), version)
+
+
+def init_stores():
+    """Load (or build) every source store and swap them in; blocks until done"""
+    _init_state.update(status="loading", error=None, started_at=datetime.now().isoformat())
+    try:
+        # e.g. load the local embedding model here rather than at import
+        provider.warm_up()
+        _rebuild()
+        _init_state.update(status="ready", ready_at=datetime.now().isoformat())
+    except Exception as e:
+        _init_state.update(status="failed", error=str(e))
+        print(f"RAG store initialization failed: {e}")
 
-    best = {
-        "source": None,
-        "text": None,
-        "score": 0.0
+
+def _reload_worker():
+    while True:
+        try:
+            snapshot = _rebuild()
+            _reload_state.update(last_error=None, last_reload_at=snapshot.loaded_at)
+            print(f"RAG stores reloaded (generation {snapshot.generation})")
+        except Exception as e:
+            # Keep serving the previous snapshot
+            _reload_state["last_error"] = str(e)
+            print(f"RAG store reload failed: {e}")
+
+        with _init_lock:
+            if not _reload_state["pending"]:
+                _reload_state["running"] = False
+                return
+            _reload_state["pending"] = False
+
+
+def reload_stores(trigger="admin"):
+    """Rebuild the stores from the data files in the background and swap them in
+
+    Queries are served from the current snapshot until the new one is
+    ready. Returns False if a reload was already running (one more run is
+    then queued so the latest files are always picked up).
+    """
+    if not is_ready():
+        start_background_init()
+        return False
+
+    with _init_lock:
+        _reload_state["last_trigger"] = trigger
+        if _reload_state["running"]:
+            _reload_state["pending"] = True
+            return False
+        _reload_state["running"] = True
+
+    threading.Thread(target=_reload_worker, name="rag-reload", daemon=True).start()
+    return True
+
+
+def _attach_shared_version(version):
+    try:
+        version, stores = load_shared_index(SHARED_INDEX_DIR, version)
+        _swap(stores, _build_indexes(stores), version)
+        print(f"Switched to shared RAG index {version}")
+    except Exception as e:
+        print(f"Shared RAG index {version} could not be loaded: {e}")
+    finally:
+        _shared_state["refreshing"] = False
+
+
+def refresh_shared_index():
+    """Pick up a newly published shared index in the background (throttled, cheap when unchanged)
+
+    Queries keep using the current snapshot until the new version is
+    mapped and indexed.
+    """
+    if not SHARED_INDEX or not is_ready():
+        return
+    now = time.monotonic()
+    with _init_lock:
+        if _shared_state["refreshing"] or now - _shared_state["checked_at"] < SHARED_INDEX_CHECK_SECONDS:
+            return
+        _shared_state["checked_at"] = now
+        version = current_version(SHARED_INDEX_DIR)
+        if version is None or version == _snapshot.shared_version:
+            return
+        _shared_state["refreshing"] = True
+
+    threading.Thread(
+        target=_attach_shared_version, args=(version,), name="rag-shared-refresh", daemon=True
+    ).start()
+
+
+def _data_file_signature():
+    """(mtime, size) of every data file; any change means the knowledge base was edited"""
+    signature = {}
+    for source, filename in SOURCES.items():
+        try:
+            stat = os.stat(os.path.join(DATA_DIR, filename))
+            signature[source] = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            signature[source] = None
+    return signature
+
+
+def _watch_data_files():
+    last = _data_file_signature()
+    while True:
+        time.sleep(WATCH_INTERVAL)
+        if not is_ready():
+            # Keep the signature from before the initial build: it may have read a
+            # file before it changed, so changes seen while loading reload once ready
+            continue
+        current = _data_file_signature()
+        if current != last:
+            changed = [source for source in current if current[source] != last.get(source)]
+            print(f"RAG data files changed ({', '.join(changed)}), reloading")
+            # A reload already running queues another one, so the change is never lost
+            reload_stores(trigger="watcher")
+            last = current
+
+
+def start_data_watcher():
+    """Start the polling data-file watcher if rag_watch_interval is set"""
+    global _watch_thread
+
+    with _init_lock:
+        if not WATCH_INTERVAL or _watch_thread is not None:
+            return
+        _watch_thread = threading.Thread(target=_watch_data_files, name="rag-watch", daemon=True)
+        _watch_thread.start()
+
+
+def start_background_init():
+    """Start init_stores() on a daemon thread unless it is running or already done"""
+    global _init_thread
+
+    with _init_lock:
+        if _init_state["status"] in ("loading", "ready"):
+            return
+        _init_state["status"] = "loading"
+        _init_thread = threading.Thread(target=init_stores, name="rag-init", daemon=True)
+        _init_thread.start()
+
+
+def is_ready():
+    return _init_state["status"] == "ready"
+
+
+def index_generation():
+    """Generation of the snapshot serving queries; changes on every reload/swap"""
+    return _snapshot.generation
+
+
+def readiness():
+    """Store initialization status for the health endpoint"""
+    snapshot = _snapshot
+    return {
+        **_init_state,
+        "ready": is_ready(),
+        "sources": {source: len(store) for source, store in snapshot.stores.items()},
+        "generation": snapshot.generation,
+        "loaded_at": snapshot.loaded_at,
+        "shared_index_version": snapshot.shared_version,
+        "reload": dict(_reload_state),
+        "query_cache": query_cache_stats(),
+        "embed_coalescing": embed_flight.stats(),
+        "embed_batching": query_batcher.stats()
     }
 
-    for source, store in EMBEDDING_STORES.items():
-        for item in store:
-            score = cosine(q_emb, item["embedding"])
-            if score > best["score"]:
-                best.update({
-                    "source": source,
-                    "text": item["text"],
-                    "score": score
-                })
-
-    if best["score"] >= threshold:
-        return best
-    return None
 
+def _nprobe(exact: bool):
+    return None if exact or INDEX_MODE != "ivf" else IVF_NPROBE
+
+# ------------------ SEARCH ------------------
+def sources_for_site(website_source):
+    """Source weights for a website_source, or None to search every source"""
+    if not SOURCE_ROUTING or not website_source:
+        return None
+    return SITE_SOURCE_WEIGHTS.get(get_database_by_website_source(website_source))
+
+
+def _weights(sources):
+    """Accept {source: weight}, a list of source names or None (all sources)"""
+    if sources is None or isinstance(sources, dict):
+        return sources
+    return {source: 1.0 for source in sources}
+
+
+def _search(snapshot, query: str, q_emb, top_k, threshold, exact, weights=None):
+    """Rank a snapshot's stored passages for an already-embedded query (dense or hybrid)
+
+    A routed search (weights given) that finds nothing above threshold is
+    retried over all sources with the same query vector.
+    """
+    if RETRIEVAL_MODE == "hybrid":
+        hits = hybrid_search(
+            snapshot.combined, snapshot.lexical, query, normalize_vector(q_emb),
+            top_k=top_k, nprobe=_nprobe(exact), min_score=threshold, weights=weights
+        )
+    else:
+        hits = snapshot.combined.search(q_emb, top_k, _nprobe(exact), threshold, weights)
+
+    if not hits and weights is not None:
+        return _search(snapshot, query, q_emb, top_k, threshold, exact)
+    return hits
+
+
+def lexical_match(query: str, sources=None):
+    """Confident keyword answer from the BM25 index, or None (no embedding call)"""
+    if not LEXICAL_FAST_PATH or not is_ready():
+        return None
+    return _snapshot.lexical.match(query, max_terms=LEXICAL_MAX_TERMS, sources=_weights(sources))
+
+
+def retrieve(query: str, top_k=5, threshold=None, exact=False, sources=None):
+    """Top-k passages as [{"source", "text", "score"}], best first
+
+    Only hits scoring at least threshold (if given) are returned; empty
+    while the stores are still loading. sources restricts the search to
+    some sources, given as a list of names or {source: score weight}
+    (see sources_for_site()); None searches all of them.
+    """
+    if not is_ready():
+        start_background_init()
+        return []
+
+    refresh_shared_index()
+    snapshot = _snapshot
+    return _search(snapshot, query, embed_query(query), top_k, threshold, exact, _weights(sources))
+
+
+async def retrieve_async(query: str, top_k=5, threshold=None, exact=False, sources=None):
+    """retrieve() for async handlers: awaits the embedding, scores off the event loop"""
+    if not is_ready():
+        start_background_init()
+        return []
+
+    refresh_shared_index()
+    snapshot = _snapshot
+    q_emb = await embed_query_async(query)
+    # NumPy releases the GIL during the matrix product, so a worker thread runs it in parallel
+    return await asyncio.to_thread(
+        _search, snapshot, query, q_emb, top_k, threshold, exact, _weights(sources)
+    )
+
+
+def search_all_sources(query: str, threshold=0.6, exact=False, sources=None):
+    """Best single match (within sources, else across all), or None below threshold / while loading"""
+    match = lexical_match(query, sources)
+    if match:
+        return match
 
-def search_all_sources_debug(query: str, threshold=0.55, top_k=5):
-    q_emb = embed(query)
-    all_results = []
-    for source, store in EMBEDDING_STORES.items():
-        for item in store:
-            score = cosine(q_emb, item["embedding"])
-            all_results.append({
-                "source": source,
-                "text": item["text"],
-                "score": score
-            })
-    # Sort and get top matches
-    all_results.sort(key=lambda x: x["score"], reverse=True)
+    hits = retrieve(query, top_k=1, threshold=threshold, exact=exact, sources=sources)
+    return hits[0] if hits else None
+
+
+async def search_all_sources_async(query: str, threshold=0.6, exact=False, sources=None):
+    match = lexical_match(query, sources)
+    if match:
+        return match
+
+    hits = await retrieve_async(query, top_k=1, threshold=threshold, exact=exact, sources=sources)
+    return hits[0] if hits else None
+
+
+def search_all_sources_debug(query: str, threshold=0.55, top_k=5, exact=False):
+    if not is_ready():
+        start_background_init()
+        print(f"=== DEBUG: RAG stores not ready ({_init_state['status']}) ===")
+        return None
+
+    top_results = retrieve(query, top_k=top_k, exact=exact)
     print(f"=== DEBUG: Top {top_k} matches for query: '{query}' ===")
-    for i, res in enumerate(all_results[:top_k]):
+    for i, res in enumerate(top_results):
         print(f"[{i+1}] Score: {res['score']:.3f} | Source: '{res['source']}'")
         print(f"    Text: {res['text'][:200]}")
         print("-" * 50)
     # Return the best if above threshold
-    if all_results and all_results[0]['score'] >= threshold:
-        return all_results[0]
-    return None
\ No newline at end of file
+    if top_results and top_results[0]['score'] >= threshold:
+        return top_results[0]
+    return None
@@ -1,10 +1,15 @@
 # services/__init__.py
 from .client_service import ClientService, submit_client_info_async, get_clients_info_async
 from .email_service import process_contact_email_async
+from .email_queue import enqueue_contact_email, start_email_workers, stop_email_workers, email_queue_stats
 
 __all__ = [
     'ClientService',
     'submit_client_info_async',
     'get_clients_info_async',
-    'process_contact_email_async'
+    'process_contact_email_async',
+    'enqueue_contact_email',
+    'start_email_workers',
+    'stop_email_workers',
+    'email_queue_stats'
 ]
\ No newline at end of file
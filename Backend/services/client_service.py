@@ -2,7 +2,7 @@
 import logging
 from typing import Dict, Any
 from models.client_model import ClientModel, get_clients_data_async
-from services.email_service import process_contact_email_async
+from services.email_queue import enqueue_contact_email
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
@@ -12,7 +12,7 @@ class ClientService:
     
     @staticmethod
     async def submit_client_info(data: Dict[str, Any]) -> Dict[str, Any]:
-        """Process client submission with email notification"""
+        """Save a client submission and queue its email notification"""
         logger.info(f"Processing client submission: {data.get('email')}")
         
         try:
@@ -31,24 +31,15 @@ class ClientService:
                 }
             
 
-            email_result = await process_contact_email_async(
+            # The notification is sent by the email queue workers; the client does not wait on SendGrid
+            email_queued = await enqueue_contact_email(
                 data, 
                 is_new_client=save_result.get('is_new_client', False),
                 database=save_result.get('database', 'unknown')
             )
             
-            # Check if email was sent successfully
-            email_sent = email_result.get('email_sent', False) 
-            email_success = email_result.get('success', False) 
-            
-            logger.info(f"email_sent: {email_sent}, email_success: {email_success}")
-
-            # Use either email_sent or success field
-            email_actually_sent = email_sent or email_success
-            
-            if not email_actually_sent:
-                email_error = email_result.get('error', email_result.get('message', 'Unknown email error'))
-                logger.warning(f"Email notification failed: {email_error}")
+            if not email_queued:
+                logger.warning(f"Email notification could not be queued for: {data.get('email')}")
                 
                 # Still return success for database, but indicate email failure
                 return {
@@ -56,23 +47,22 @@ class ClientService:
                     'message': 'Client data saved but email notification failed',
                     'database': save_result.get('database', 'unknown'),
                     'email_sent': False,
+                    'email_queued': False,
                     'client_saved': True,
                     'is_new_client': save_result.get('is_new_client', False),
-                    'email_error': str(email_error),
-                    'timestamp': datetime.now().isoformat(),
-                    'email_result': email_result  # Include full email result for debugging
+                    'email_error': 'Email queue full',
+                    'timestamp': datetime.now().isoformat()
                 }
             
-            # Both database and email succeeded
-            logger.info(f"Email sent successfully to: {email_result.get('recipient', 'unknown')}")
+            # Saved; the email goes out in the background
             return {
                 'status': 'success',
                 'message': 'Client information submitted successfully',
                 'database': save_result.get('database', 'unknown'),
-                'email_sent': True,
+                'email_sent': None,
+                'email_queued': True,
                 'client_saved': True,
                 'is_new_client': save_result.get('is_new_client', False),
-                'recipient': email_result.get('recipient', 'unknown'),
                 'timestamp': datetime.now().isoformat()
             }
             
@@ -0,0 +1,155 @@
+# services/email_queue.py
+import os
+import json
+import random
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from services.email_service import process_contact_email_async
+
+logger = logging.getLogger(__name__)
+
+# Bounded queue drained by a small worker pool; notifications that still fail after
+# the last retry (or that do not fit in the queue) are appended to the dead-letter file
+EMAIL_QUEUE_SIZE = int(os.getenv("email_queue_size", "1000"))
+EMAIL_WORKERS = int(os.getenv("email_queue_workers", "2"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("email_max_attempts", "5"))
+EMAIL_RETRY_BACKOFF = float(os.getenv("email_retry_backoff", "2"))  # seconds, doubled per retry
+EMAIL_DRAIN_TIMEOUT = float(os.getenv("email_drain_timeout", "10"))  # seconds at shutdown
+EMAIL_DEAD_LETTER_PATH = os.getenv("email_dead_letter_path", "email_dead_letter.jsonl")
+
+_queue: Optional[asyncio.Queue] = None
+_workers: List[asyncio.Task] = []
+_stats = {"queued": 0, "sent": 0, "retried": 0, "dead_lettered": 0}
+
+
+async def start_email_workers():
+    """Create the queue and start the worker pool (startup); no-op if already running"""
+    global _queue
+
+    if _workers:
+        return
+    _queue = asyncio.Queue(maxsize=EMAIL_QUEUE_SIZE)
+    for n in range(max(1, EMAIL_WORKERS)):
+        _workers.append(asyncio.create_task(_worker(), name=f"email-worker-{n}"))
+    logger.info(f"Email queue started ({len(_workers)} workers, max {EMAIL_QUEUE_SIZE} pending)")
+
+
+async def enqueue_contact_email(data: Dict[str, Any], is_new_client: bool = False,
+    database: str = "unknown") -> bool:
+    """Queue a contact notification; returns False if it went to the dead-letter file instead"""
+    if not _workers:
+        await start_email_workers()
+
+    job = {
+        "data": dict(data),
+        "is_new_client": is_new_client,
+        "database": database,
+        "attempts": 0,
+        "queued_at": datetime.now().isoformat()
+    }
+    try:
+        _queue.put_nowait(job)
+    except asyncio.QueueFull:
+        logger.error("Email queue full, notification written to dead-letter file")
+        await _dead_letter(job, "queue full")
+        return False
+
+    _stats["queued"] += 1
+    return True
+
+
+async def _worker():
+    while True:
+        job = await _queue.get()
+        try:
+            await _deliver(job)
+        except asyncio.CancelledError:
+            await _dead_letter(job, "shutdown during delivery")
+            raise
+        except Exception as e:
+            logger.error(f"Unexpected error delivering email: {e}", exc_info=True)
+            await _dead_letter(job, str(e))
+        finally:
+            _queue.task_done()
+
+
+def _retryable(result: Dict[str, Any]) -> bool:
+    """Network errors, rate limits and 5xx are retried; configuration and request errors are not"""
+    if result.get("retryable") is False:
+        return False
+    status_code = result.get("status_code")
+    return status_code is None or status_code == 429 or status_code >= 500
+
+
+async def _deliver(job: Dict[str, Any]):
+    error = None
+    while job["attempts"] < EMAIL_MAX_ATTEMPTS:
+        job["attempts"] += 1
+        result = await process_contact_email_async(
+            job["data"],
+            is_new_client=job["is_new_client"],
+            database=job["database"]
+        )
+        if result.get("email_sent") or result.get("success"):
+            _stats["sent"] += 1
+            logger.info(f"Email notification sent for {job['data'].get('email')} (attempt {job['attempts']})")
+            return
+
+        error = result.get("error", result.get("message", "Unknown email error"))
+        if not _retryable(result) or job["attempts"] >= EMAIL_MAX_ATTEMPTS:
+            break
+
+        delay = EMAIL_RETRY_BACKOFF * (2 ** (job["attempts"] - 1)) * (1 + random.random())
+        logger.warning(f"Email notification failed ({error}); retry {job['attempts']} in {delay:.1f}s")
+        _stats["retried"] += 1
+        await asyncio.sleep(delay)
+
+    await _dead_letter(job, error)
+
+
+def _append_dead_letter(line: str):
+    with open(EMAIL_DEAD_LETTER_PATH, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+
+
+async def _dead_letter(job: Dict[str, Any], error: Optional[str]):
+    """Persist an undeliverable notification so it can be inspected or resent by hand"""
+    _stats["dead_lettered"] += 1
+    record = {**job, "error": str(error), "failed_at": datetime.now().isoformat()}
+    logger.error(f"Email notification for {job['data'].get('email')} dead-lettered: {error}")
+    try:
+        await asyncio.to_thread(_append_dead_letter, json.dumps(record, ensure_ascii=False, default=str))
+    except Exception as e:
+        logger.error(f"Could not write email dead-letter record: {e}")
+
+
+async def stop_email_workers(timeout: float = EMAIL_DRAIN_TIMEOUT):
+    """Let the workers drain the queue for up to timeout seconds, then stop them (shutdown)
+
+    Notifications still pending afterwards are dead-lettered rather than lost.
+    """
+    if not _workers:
+        return
+    try:
+        await asyncio.wait_for(_queue.join(), timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"Email queue not drained after {timeout}s, {_queue.qsize()} pending")
+
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+
+    while not _queue.empty():
+        await _dead_letter(_queue.get_nowait(), "shutdown before delivery")
+    logger.info("Email queue stopped")
+
+
+def email_queue_stats() -> Dict[str, Any]:
+    return {
+        **_stats,
+        "pending": _queue.qsize() if _queue is not None else 0,
+        "workers": len(_workers)
+    }
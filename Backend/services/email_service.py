@@ -1,14 +1,16 @@
 # services/email_service.py
 import os
-import sendgrid
 from sendgrid.helpers.mail import Mail, Content
 from dotenv import load_dotenv
 import logging
 from datetime import datetime
+from http_client import get_async_http_client
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
+SENDGRID_SEND_URL = "https://api.sendgrid.com/v3/mail/send"
+
 async def process_contact_email_async(data, is_new_client=False, database="unknown"):
     print("=" * 50)
     
@@ -25,7 +27,8 @@ async def process_contact_email_async(data, is_new_client=False, database="unkno
         return {
             "success": False,
             "email_sent": False,
-            "error": error_msg
+            "error": error_msg,
+            "retryable": False
         }
     
     if not from_email or not to_email:
@@ -35,13 +38,11 @@ async def process_contact_email_async(data, is_new_client=False, database="unkno
         return {
             "success": False,
             "email_sent": False,
-            "error": error_msg
+            "error": error_msg,
+            "retryable": False
         }
     
     try:
-        # Initialize SendGrid client
-        sg = sendgrid.SendGridAPIClient(api_key=sendgrid_api_key)
-        
         # Extract all possible field names
         fname = data.get('clientfname', data.get('fname', data.get('client_fname', 'N/A')))
         lname = data.get('clientlname', data.get('lname', data.get('client_lname', 'N/A')))
@@ -140,8 +141,13 @@ async def process_contact_email_async(data, is_new_client=False, database="unkno
         # Add plain text version
         message.content = Content("text/plain", content_text)
         
-        # Send the email
-        response = sg.send(message)
+        # Send the email through the shared keep-alive client (no new TLS handshake per mail)
+        sendgrid_client = get_async_http_client("sendgrid")
+        response = await sendgrid_client.post(
+            SENDGRID_SEND_URL,
+            json=message.get(),
+            headers={"Authorization": f"Bearer {sendgrid_api_key}"}
+        )
                        
         if response.status_code in [200, 202]:
             
@@ -155,13 +161,13 @@ async def process_contact_email_async(data, is_new_client=False, database="unkno
         else:
             error_msg = f"SendGrid returned status {response.status_code}"
             print(f"{error_msg}")
-            print(f"Response body: {response.body}")
+            print(f"Response body: {response.text}")
             return {
                 "success": False,
                 "email_sent": False,
                 "error": error_msg,
                 "status_code": response.status_code,
-                "response_body": response.body.decode('utf-8') if response.body else None
+                "response_body": response.text or None
             }
             
     except Exception as e:
@@ -1,6 +1,6 @@
 #from models.client_model import save_query_data
 from models.client_model import save_query_data_async
-from services.email_service import process_contact_email_async
+from services.email_queue import enqueue_contact_email
 import aiomysql
 
 async def submit_query_info_async(data):
@@ -14,8 +14,8 @@ async def submit_query_info_async(data):
     if not success:
         return {"error": "Error inserting query"}, 500   
 
-    #send email asynchronously
-    await process_contact_email_async(data)
+    #send email asynchronously (background queue)
+    await enqueue_contact_email(data)
 
     return {"message": "Query submitted succesfully"}, 201
 
@@ -0,0 +1,6 @@
+# tests/conftest.py
+import os
+import sys
+
+# Backend modules (rag, http_client, ...) are imported top-level, as the app does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
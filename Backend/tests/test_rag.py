@@ -0,0 +1,169 @@
+# tests/test_rag.py
+import time
+import asyncio
+import numpy as np
+import pytest
+
+from rag.batch import EmbeddingBatcher
+from rag.cache import AnswerCache, EmbeddingCache
+from rag.chunking import iter_chunks
+from rag.providers import HashEmbeddingProvider
+from rag.singleflight import SingleFlight
+
+hash_provider = HashEmbeddingProvider(64)
+
+
+# ------------------ CHUNKING ------------------
+@pytest.fixture
+def knowledge_file(tmp_path):
+    path = tmp_path / "knowledge.txt"
+    path.write_text(
+        "# Hours\nOpen weekdays\nnine to five\n\n"
+        "# Support\nCall us\n\nor mail us any time\n",
+        encoding="utf-8"
+    )
+    return str(path)
+
+
+def test_iter_chunks_modes(knowledge_file):
+    assert list(iter_chunks(knowledge_file)) == [
+        "# Hours", "Open weekdays", "nine to five", "# Support", "Call us", "or mail us any time"
+    ]
+    assert list(iter_chunks(knowledge_file, mode="paragraph")) == [
+        "# Hours Open weekdays nine to five", "# Support Call us", "or mail us any time"
+    ]
+    assert list(iter_chunks(knowledge_file, mode="heading")) == [
+        "Hours Open weekdays nine to five", "Support Call us or mail us any time"
+    ]
+    assert list(iter_chunks(knowledge_file, mode="paragraph", min_tokens=5)) == [
+        "# Hours Open weekdays nine to five", "# Support Call us or mail us any time"
+    ]
+    assert list(iter_chunks(knowledge_file, mode="heading", max_tokens=4, overlap=1)) == [
+        "Hours Open weekdays nine", "nine to five", "Support Call us or", "or mail us any", "any time"
+    ]
+
+
+def test_iter_chunks_windows(knowledge_file):
+    words = open(knowledge_file, encoding="utf-8").read().split()
+    chunks = list(iter_chunks(knowledge_file, mode="window", max_tokens=6, overlap=2))
+    assert chunks[0].split() == words[:6]
+    assert chunks[1].split()[:2] == words[4:6]
+    assert chunks[-1].split()[-1] == words[-1]
+    with pytest.raises(ValueError):
+        list(iter_chunks(knowledge_file, mode="window", max_tokens=4, overlap=4))
+    with pytest.raises(ValueError):
+        list(iter_chunks(knowledge_file, mode="sentence"))
+
+
+# ------------------ QUERY-EMBEDDING CACHE ------------------
+def test_embedding_cache_lru_and_sqlite_tier(tmp_path):
+    db_path = str(tmp_path / "queries.db")
+    cache = EmbeddingCache(max_entries=2, db_path=db_path, db_max_entries=3, db_prune_every=1)
+    for i in range(5):
+        cache.put(f"q{i}", np.full(4, i))
+    assert cache.stats()["size"] == 2
+
+    # A new process only has the disk tier, pruned to the newest rows
+    reopened = EmbeddingCache(max_entries=2, db_path=db_path)
+    assert np.allclose(asyncio.run(reopened.aget("q4")), 4)
+    assert reopened.get("q0") is None
+    assert reopened.stats()["disk_hits"] == 1
+
+
+# ------------------ ANSWER CACHE ------------------
+PARAMS = {"model": "gpt", "temperature": 0}
+
+
+def test_answer_cache_exact_hits_and_eviction():
+    cache = AnswerCache(max_entries=2)
+    cache.put("What are your hours?", PARAMS, "9-17")
+    assert cache.get("what are  your HOURS?", PARAMS) == "9-17"
+
+    cache.put("second", PARAMS, "2")
+    cache.get("what are your hours?", PARAMS)
+    cache.put("third", PARAMS, "3")
+    # The least recently used entry went
+    assert cache.get("second", PARAMS) is None
+    assert cache.get("what are your hours?", PARAMS) == "9-17"
+
+    # Other parameters invalidate every cached answer
+    assert cache.get("third", {**PARAMS, "temperature": 1}) is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_answer_cache_ttl():
+    cache = AnswerCache(ttl=0.05)
+    cache.put("q", PARAMS, "a")
+    assert cache.get("q", PARAMS) == "a"
+    time.sleep(0.1)
+    assert cache.get("q", PARAMS) is None
+
+
+def test_answer_cache_semantic_hits():
+    cache = AnswerCache(semantic_threshold=0.8)
+    hours = hash_provider.embed("what are your opening hours")
+    cache.put("what are your opening hours", PARAMS, "9-17", hours)
+
+    assert cache.get("when are you open", PARAMS, hash_provider.embed("what are your opening hours today")) == "9-17"
+    assert cache.get("pricing", PARAMS, hash_provider.embed("how much does support cost")) is None
+    assert cache.stats()["semantic_hits"] == 1
+
+
+def test_answer_cache_size_zero_is_disabled():
+    cache = AnswerCache(max_entries=0, semantic_threshold=0.8)
+    vector = hash_provider.embed("q")
+    cache.put("q", PARAMS, "a", vector)
+    assert cache.get("q", PARAMS, vector) is None
+    assert cache.stats()["size"] == 0
+
+
+# ------------------ REQUEST COALESCING ------------------
+def test_batcher_sends_duplicates_once():
+    sent = []
+
+    async def aembed_many(texts):
+        sent.append(texts)
+        return hash_provider.embed_many(texts)
+
+    async def main():
+        batcher = EmbeddingBatcher(aembed_many, max_batch=8, max_wait=0.01)
+        vectors = await asyncio.gather(*[batcher.embed(text) for text in ["a", "b", "a", "c", "a"]])
+        return batcher, vectors
+
+    batcher, vectors = asyncio.run(main())
+    assert sent == [["a", "b", "c"]]
+    assert vectors[0] == vectors[2] == vectors[4] == hash_provider.embed("a")
+    assert batcher.stats()["texts"] == 5
+    assert not batcher._tasks
+
+
+def test_batcher_fails_every_caller_of_a_failed_batch():
+    async def aembed_many(texts):
+        raise RuntimeError("upstream down")
+
+    async def main():
+        batcher = EmbeddingBatcher(aembed_many, max_batch=2)
+        return await asyncio.gather(batcher.embed("a"), batcher.embed("b"), return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in asyncio.run(main()))
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def main():
+        flight = SingleFlight()
+        results = await asyncio.gather(*[flight.do("key", call) for _ in range(5)])
+        # Finished calls are not cached: the next one runs again
+        results.append(await flight.do("key", call))
+        return flight, results
+
+    flight, results = asyncio.run(main())
+    assert results == ["answer"] * 6
+    assert len(calls) == 2
+    assert flight.stats()["shared"] == 4
@@ -0,0 +1,72 @@
+# tests/test_store.py
+import json
+import httpx
+import numpy as np
+import pytest
+from openai import OpenAI
+
+from rag.batch import embed_in_batches
+from rag.providers import HashEmbeddingProvider, OpenAIEmbeddingProvider
+from rag.store import update_store
+
+hash_provider = HashEmbeddingProvider(64)
+
+
+def fake_embeddings_client(requests, fail_first=0):
+    """OpenAI client whose embeddings endpoint is served in-process from the hash provider"""
+    failures = [fail_first]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if failures[0]:
+            failures[0] -= 1
+            return httpx.Response(429, json={"error": {"message": "slow down"}})
+        texts = json.loads(request.content)["input"]
+        requests.append(texts)
+        data = [
+            {"object": "embedding", "index": i, "embedding": vector}
+            for i, vector in enumerate(hash_provider.embed_many(texts))
+        ]
+        return httpx.Response(200, json={"object": "list", "data": data, "model": "fake",
+            "usage": {"prompt_tokens": 0, "total_tokens": 0}})
+
+    return OpenAI(api_key="test", base_url="http://fake/v1", max_retries=0,
+        http_client=httpx.Client(transport=httpx.MockTransport(handler)))
+
+
+def test_update_store_embeds_only_new_lines():
+    requests = []
+    client = fake_embeddings_client(requests)
+    provider = OpenAIEmbeddingProvider(lambda: client, None, "fake-model")
+
+    def embed(texts):
+        return embed_in_batches(texts, provider.embed_many, batch_size=2, backoff=0)
+
+    store, stats = update_store(None, "support", ["a b", "c d", "e f"], provider.model_id, embed)
+    assert stats == {"added": 3, "removed": 0, "reused": 0}
+    assert sorted(len(batch) for batch in requests) == [1, 2]
+
+    requests.clear()
+    updated, stats = update_store(store, "support", ["c d", "e f", "g h", "g h"], provider.model_id, embed)
+    assert stats == {"added": 1, "removed": 1, "reused": 2}
+    assert requests == [["g h"]]
+    assert np.allclose(updated.matrix[0], store.matrix[1])
+
+    # Another model cannot reuse the rows
+    _, stats = update_store(updated, "support", ["c d"], "other-model", embed)
+    assert stats == {"added": 1, "removed": 0, "reused": 0}
+
+
+def test_embed_in_batches_retries_rate_limits():
+    requests = []
+    client = fake_embeddings_client(requests, fail_first=2)
+    provider = OpenAIEmbeddingProvider(lambda: client, None)
+
+    vectors = embed_in_batches(["x", "y"], provider.embed_many, batch_size=8, backoff=0,
+        retry_on=provider.retry_errors)
+    assert np.allclose(vectors, hash_provider.embed_many(["x", "y"]))
+
+
+def test_openai_provider_without_client():
+    provider = OpenAIEmbeddingProvider(lambda: None, None)
+    with pytest.raises(RuntimeError):
+        provider.embed("x")